@@ -0,0 +1,56 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from api.views import IngredientViewSet, RecipeViewSet, TagViewSet
+from foodgram_backend.db import check_connections
+from foodgram_backend.profiling import watching
+
+
+def async_view(view):
+    """Serve a sync DRF view from an async view under ASGI.
+
+    Django 3.2 has no async ORM or cache API, so this is a
+    ``sync_to_async`` wrapper, not an async path: the view still runs
+    synchronously, in the shared thread pool instead of the single
+    thread Django uses for sync views under ASGI. The thread hop makes
+    each request slower than under WSGI, as the load test shows; the
+    wrapper only stops requests under ASGI from queueing behind each
+    other. Connections are recycled in the worker thread the same way
+    Django does it around every WSGI request, and the queries of a
+    profiled request are recorded there too.
+    """
+    def run(request, *args, **kwargs):
+        close_old_connections()
+        if settings.CONN_HEALTH_CHECKS:
+            check_connections()
+        try:
+            with watching():
+                response = view(request, *args, **kwargs)
+                if hasattr(response, 'render'):
+                    response.render()
+            return response
+        finally:
+            close_old_connections()
+
+    run = sync_to_async(run, thread_sensitive=False)
+
+    async def handler(request, *args, **kwargs):
+        return await run(request, *args, **kwargs)
+
+    handler.csrf_exempt = True
+    return handler
+
+
+recipe_list = async_view(RecipeViewSet.as_view(
+    {'get': 'list', 'post': 'create'}))
+recipe_detail = async_view(RecipeViewSet.as_view({
+    'get': 'retrieve',
+    'put': 'update',
+    'patch': 'partial_update',
+    'delete': 'destroy'
+}))
+ingredient_list = async_view(IngredientViewSet.as_view(
+    {'get': 'list', 'post': 'create'}))
+tag_list = async_view(TagViewSet.as_view({'get': 'list'}))
+tag_detail = async_view(TagViewSet.as_view({'get': 'retrieve'}))
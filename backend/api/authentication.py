@@ -0,0 +1,115 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.fields.files import FieldFile
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from api.cache import LocalCache
+from users.models import User
+
+# Left out of snapshots: secrets, and fields that change without a
+# post_save (counters) or on every login. They are loaded on access.
+UNCACHED_FIELDS = ('password', 'last_login', *User.counter_fields)
+
+SNAPSHOT_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.name not in UNCACHED_FIELDS
+)
+
+local_cache = LocalCache(settings.AUTH_TOKEN_CACHE_SIZE,
+                         settings.AUTH_TOKEN_CACHE_TIMEOUT)
+
+
+def shared_key(key):
+    # Token keys are credentials; do not store them in the cache verbatim.
+    return f'auth:token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def snapshot(user):
+    values = []
+    for name in SNAPSHOT_FIELDS:
+        value = getattr(user, name)
+        if isinstance(value, FieldFile):
+            value = value.name
+        values.append(value)
+    return tuple(values)
+
+
+def restore(values):
+    # A fresh instance per request; the rest of the fields are deferred.
+    return User.from_db('default', SNAPSHOT_FIELDS, values)
+
+
+def get_snapshot(key):
+    values = local_cache.get(key)
+    if values is None and settings.AUTH_TOKEN_SHARED_CACHE_TIMEOUT:
+        values = cache.get(shared_key(key))
+        if values is not None:
+            local_cache.set(key, values)
+    return values
+
+
+def set_snapshot(key, user):
+    values = snapshot(user)
+    local_cache.set(key, values)
+    if settings.AUTH_TOKEN_SHARED_CACHE_TIMEOUT:
+        cache.set(shared_key(key), values,
+                  settings.AUTH_TOKEN_SHARED_CACHE_TIMEOUT)
+
+
+def forget(*keys):
+    for key in keys:
+        local_cache.delete(key)
+    if settings.AUTH_TOKEN_SHARED_CACHE_TIMEOUT:
+        cache.delete_many([shared_key(key) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication that keeps a snapshot of the token's user.
+
+    Snapshots live in a per-process LRU cache and, when
+    ``AUTH_TOKEN_SHARED_CACHE_TIMEOUT`` is set, in the Django cache
+    shared by the workers, so authenticated requests skip the token
+    query. Other workers may accept a revoked token, or return an
+    outdated user, until their local entry expires
+    (``AUTH_TOKEN_CACHE_TIMEOUT``). Views that save the user therefore
+    load a current row instead of saving ``request.user``.
+    """
+
+    def authenticate_credentials(self, key):
+        values = get_snapshot(key)
+        if values is None:
+            user, token = super().authenticate_credentials(key)
+            set_snapshot(key, user)
+            return user, token
+        user = restore(values)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+        return user, Token(key=key, user=user)
+
+
+@receiver(post_delete, sender=Token)
+def forget_token(instance, **kwargs):
+    # Logout, and deleting the user, which cascades to the token.
+    forget(instance.key)
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(instance, created, update_fields=None, raw=False,
+                       **kwargs):
+    if created or raw:
+        return
+    # Logging in only updates last_login.
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    keys = list(Token.objects.filter(user=instance).values_list(
+        'key', flat=True))
+    if keys:
+        forget(*keys)
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from rest_framework.response import Response
+
+from users.models import Ingredient, Tag
+
+
+class LocalCache:
+    """Thread-safe in-process LRU cache with a TTL."""
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.timeout, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+def version_key(namespace):
+    return f'api:{namespace}:version'
+
+
+def get_version(namespace):
+    version = cache.get(version_key(namespace))
+    if version is None:
+        # Start from a timestamp so that entries cached under a version
+        # that was evicted are never served again.
+        version = int(time.time() * 1000)
+        if not cache.add(version_key(namespace), version, timeout=None):
+            version = cache.get(version_key(namespace), version)
+    return version
+
+
+def bump_version(namespace):
+    try:
+        cache.incr(version_key(namespace))
+    except ValueError:
+        get_version(namespace)
+
+
+def make_etag(data):
+    return quote_etag(hashlib.md5(json.dumps(
+        data, sort_keys=True, ensure_ascii=False, default=str
+    ).encode()).hexdigest())
+
+
+class CachedResponseMixin:
+    """Cache serialized list/detail payloads of a read-only viewset.
+
+    Payloads are stored under the namespace version, so bumping the
+    version invalidates every cached response of the namespace at once.
+    A hit skips the ORM and the serializer; matching If-None-Match
+    requests get 304 Not Modified.
+    """
+
+    cache_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, view, request, *args, **kwargs):
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        key = (f'api:{self.cache_namespace}:'
+               f'{get_version(self.cache_namespace)}:{path}')
+        cached = cache.get(key)
+        if cached is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            cached = (response.data, make_etag(response.data))
+            cache.set(key, cached, settings.API_CACHE_TIMEOUT)
+        data, etag = cached
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = Response(data)
+        response['ETag'] = etag
+        return response
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tags(**kwargs):
+    bump_version('tags')
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredients(**kwargs):
+    bump_version('ingredients')
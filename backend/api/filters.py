@@ -1,11 +1,33 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
-from users.models import Ingredient, Recipe
+from rest_framework.exceptions import ValidationError
+
+from api.cache import get_version
+from users.models import Recipe, Tag, TagRecipe
+from users.search import search_recipes
+
+
+def tag_ids_by_slug():
+    """Return ``{slug: id}`` for all tags, cached until a tag changes."""
+    key = f'api:tags:{get_version("tags")}:slugs'
+    tag_ids = cache.get(key)
+    if tag_ids is None:
+        tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(key, tag_ids, settings.API_CACHE_TIMEOUT)
+    return tag_ids
+
+
+def tag_choices():
+    return [(slug, slug) for slug in tag_ids_by_slug()]
 
 
 class RecipeFilter(filters.FilterSet):
 
-    tags = filters.AllValuesMultipleFilter(
-        field_name='tags__slug',
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices,
+        method='filter_tags',
         label='Filter by tag slug'
     )
     author = filters.NumberFilter(
@@ -15,25 +37,39 @@ class RecipeFilter(filters.FilterSet):
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
+    search = filters.CharFilter(
+        method='filter_search',
+        label='Full-text search by name, ingredients and text'
+    )
 
     class Meta:
         model = Recipe
-        fields = ['tags', 'author', 'is_favorited', 'is_in_shopping_cart']
+        fields = ['tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+                  'search']
+
+    def filter_tags(self, queryset, name, value):
+        tag_ids = tag_ids_by_slug()
+        return queryset.filter(Exists(TagRecipe.objects.filter(
+            recipe=OuterRef('pk'),
+            tag_id__in=[tag_ids[slug] for slug in value]
+        )))
 
     def filter_is_favorited(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
-            return queryset.filter(favorited_by__user=self.request.user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
-            return queryset.filter(shopping_carts__user=self.request.user)
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset
 
-
-class IngredientFilter(filters.FilterSet):
-    name = filters.CharFilter(field_name='name', lookup_expr='istartswith')
-
-    class Meta:
-        model = Ingredient
-        fields = ['name']
+    def filter_search(self, queryset, name, value):
+        value = value.strip()
+        if not value:
+            return queryset
+        if self.request.query_params.get('pagination') == 'cursor':
+            # The cursor keys on pub_date and would drop the ranking.
+            raise ValidationError(
+                {'search': 'Поиск не поддерживает pagination=cursor.'})
+        return search_recipes(queryset, value)
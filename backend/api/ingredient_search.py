@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.db.models.functions import Lower
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api.cache import LocalCache, get_version
+from users.models import Ingredient
+from users.serializers import IngredientSerializer
+
+
+prefix_cache = LocalCache(settings.INGREDIENT_SEARCH_CACHE_SIZE,
+                          settings.INGREDIENT_SEARCH_CACHE_TIMEOUT)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def clear_prefix_cache(**kwargs):
+    prefix_cache.clear()
+
+
+def find_ingredients(term, limit):
+    """Return up to ``limit`` ingredients matching ``term``.
+
+    Names starting with ``term`` come first and are served by the
+    ``lower(name) text_pattern_ops`` index; if there are not enough of
+    them, names containing ``term`` follow, served by the trigram index.
+    """
+    queryset = Ingredient.objects.annotate(name_lower=Lower('name'))
+    ingredients = list(
+        queryset.filter(name_lower__startswith=term)
+        .order_by('name_lower', 'id')[:limit]
+    )
+    if (len(ingredients) < limit
+            and len(term) >= settings.INGREDIENT_SEARCH_MIN_SUBSTRING_LENGTH):
+        ingredients += list(
+            queryset.filter(name_lower__contains=term)
+            .exclude(name_lower__startswith=term)
+            .order_by('name_lower', 'id')[:limit - len(ingredients)]
+        )
+    return ingredients
+
+
+def search_ingredients(term, limit=None):
+    """Return serialized search results, caching short prefixes.
+
+    Prefixes are cached per process under the shared 'ingredients'
+    version, so a change made by another process is not served again.
+    """
+    term = term.strip().lower()
+    limit = limit or settings.INGREDIENT_SEARCH_LIMIT
+    cacheable = len(term) <= settings.INGREDIENT_SEARCH_CACHED_PREFIX_LENGTH
+    if cacheable:
+        key = (get_version('ingredients'), term, limit)
+        data = prefix_cache.get(key)
+        if data is not None:
+            return data
+    data = IngredientSerializer(find_ingredients(term, limit), many=True).data
+    if cacheable:
+        prefix_cache.set(key, data)
+    return data
@@ -0,0 +1,186 @@
+import hashlib
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db import connection
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+
+
+def estimate_count(model):
+    """Return the planner's row estimate for ``model``'s table, if any."""
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator that avoids running an exact COUNT(*) on every page.
+
+    Unfiltered querysets over large tables use the PostgreSQL estimate;
+    other counts are cached for a short time under a key derived from
+    the count query, so equal filter combinations share one entry.
+    Estimated and cached counts are reported as inexact, and pages past
+    them are still read: only a page without rows is missing.
+    """
+
+    count_exact = True
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not hasattr(queryset, 'query'):
+            return super().count
+        if not queryset.query.where:
+            estimate = estimate_count(queryset.model)
+            if (estimate is not None and estimate
+                    >= settings.PAGINATION_COUNT_ESTIMATE_THRESHOLD):
+                self.count_exact = False
+                return estimate
+        try:
+            sql = str(queryset.order_by().values('pk').query)
+        except EmptyResultSet:
+            return 0
+        key = f'api:count:{hashlib.md5(sql.encode()).hexdigest()}'
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        else:
+            self.count_exact = False
+        return count
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            if self.count_exact or int(number) < 1:
+                raise
+            return int(number)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if self.count_exact:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        # One extra row tells whether there is a next page.
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage('That page contains no results')
+        page = EstimatedCountPage(rows[:self.per_page], number, self)
+        page.more = len(rows) > self.per_page
+        self.count = max(self.count, bottom + len(page.object_list))
+        self.__dict__.pop('num_pages', None)
+        return page
+
+
+class EstimatedCountPage(Page):
+    """Page of a paginator whose count may be off."""
+
+    def has_next(self):
+        return self.more
+
+
+class PageNumberPagination(pagination.PageNumberPagination):
+    django_paginator_class = CachedCountPaginator
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.page.paginator.count),
+            ('count_exact', self.page.paginator.count_exact),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count_exact'] = {'type': 'boolean'}
+        return response_schema
+
+
+class CursorPagination(pagination.CursorPagination):
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+
+class FeedPagination(CursorPagination):
+    """Keyset pagination over the ``(pub_date, id)`` keys of a feed.
+
+    DRF's cursor holds one ordering value plus an offset; the feed
+    merges two sources, so the cursor holds the full key of the last
+    item and pages only go forward.
+    """
+
+    def paginate_keys(self, read, request):
+        """Return the page of keys ``read(position, limit)`` finds."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        position = None
+        if cursor is not None and cursor.position:
+            pub_date, _, pk = cursor.position.rpartition(',')
+            pub_date = parse_datetime(pub_date)
+            if pub_date is None or not pk.isdigit():
+                raise NotFound(self.invalid_cursor_message)
+            position = (pub_date, int(pk))
+        keys = read(position, self.page_size + 1)
+        self.has_next = len(keys) > self.page_size
+        self.has_previous = False
+        keys = keys[:self.page_size]
+        if self.has_next:
+            pub_date, pk = keys[-1]
+            self.next_position = f'{pub_date.isoformat()},{pk}'
+        return keys
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(pagination.Cursor(
+            offset=0, reverse=False, position=self.next_position))
+
+    def get_previous_link(self):
+        return None
+
+
+class PageNumberOrCursorPagination(pagination.BasePagination):
+    """Page-number pagination, or keyset pagination with ?pagination=cursor.
+
+    Cursor pages are found with an indexed range scan on the view's
+    ``cursor_ordering`` instead of COUNT(*) and OFFSET, so deep pages
+    cost the same as the first one.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get('pagination') == 'cursor':
+            self.paginator = CursorPagination()
+            self.paginator.ordering = view.cursor_ordering
+        else:
+            self.paginator = PageNumberPagination()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return PageNumberPagination().get_paginated_response_schema(schema)
+
+    def get_schema_operation_parameters(self, view):
+        return PageNumberPagination().get_schema_operation_parameters(view)
@@ -0,0 +1,117 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from api.cache import bump_version, get_version
+from users.models import (
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    Tag,
+    TagRecipe
+)
+from users.serializers import RetrieveRecipeSerializer
+
+User = get_user_model()
+
+
+def recipe_keys(recipe_ids):
+    version = get_version('recipes')
+    return {pk: f'api:recipe:{version}:{pk}' for pk in recipe_ids}
+
+
+def serialize_recipes(recipes, request):
+    """Serialize recipes annotated by ``Recipe.objects.with_user_flags``.
+
+    The user-independent part of every recipe is read from the cache and
+    only misses are loaded and serialized; the per-user flags come from
+    the annotations of ``recipes``, i.e. from the page query itself.
+    Cached entries are stored per host because avatar URLs are absolute.
+    """
+    recipes = list(recipes)
+    host = request.build_absolute_uri('/')
+    keys = recipe_keys([recipe.id for recipe in recipes])
+    cached = cache.get_many(keys.values())
+    missing = [pk for pk, key in keys.items()
+               if host not in cached.get(key, {})]
+    if missing:
+        fresh = RetrieveRecipeSerializer(
+            Recipe.objects.with_related().with_user_flags(
+                AnonymousUser()).filter(id__in=missing),
+            many=True,
+            context={'request': request}
+        ).data
+        updates = {}
+        for item in fresh:
+            key = keys[item['id']]
+            updates[key] = {**cached.get(key, {}), host: item}
+        cache.set_many(updates, settings.API_CACHE_TIMEOUT)
+        cached.update(updates)
+
+    data = []
+    for recipe in recipes:
+        item = cached.get(keys[recipe.id], {}).get(host)
+        if item is None:
+            continue
+        item = dict(item)
+        item['is_favorited'] = recipe.is_favorited
+        item['is_in_shopping_cart'] = recipe.is_in_shopping_cart
+        item['author'] = dict(item['author'],
+                              is_subscribed=recipe.author_subscribed)
+        data.append(item)
+    return data
+
+
+def invalidate_recipes(recipe_ids):
+    """Drop cached recipes once the current transaction commits."""
+    recipe_ids = list(recipe_ids)
+    if recipe_ids:
+        transaction.on_commit(
+            lambda: cache.delete_many(recipe_keys(recipe_ids).values()))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe(instance, **kwargs):
+    invalidate_recipes([instance.pk])
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(post_save, sender=TagRecipe)
+@receiver(post_delete, sender=TagRecipe)
+def invalidate_recipe_rows(instance, **kwargs):
+    invalidate_recipes([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=TagRecipe)
+def invalidate_recipe_tags(instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        invalidate_recipes([instance.pk])
+    elif pk_set:
+        invalidate_recipes(pk_set)
+    else:
+        bump_version('recipes')
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(instance, created, update_fields=None,
+                              **kwargs):
+    if created or update_fields and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_recipes(
+        instance.recipe_author.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_all_recipes(**kwargs):
+    bump_version('recipes')
@@ -0,0 +1,36 @@
+from rest_framework.renderers import JSONRenderer
+
+
+class ShoppingListRenderer(JSONRenderer):
+    """Accept a shopping list ``?format=`` during content negotiation.
+
+    The list itself is streamed by the view, so these renderers are only
+    used for error responses, which are still rendered as JSON.
+    """
+
+
+class PlainTextShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+
+
+class JSONShoppingListRenderer(ShoppingListRenderer):
+    format = 'json'
+
+
+SHOPPING_LIST_RENDERERS = [
+    PlainTextShoppingListRenderer,
+    CSVShoppingListRenderer,
+    PDFShoppingListRenderer,
+    JSONShoppingListRenderer,
+]
@@ -0,0 +1,135 @@
+import csv
+import hashlib
+import json
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from api.cache import get_version
+from users.models import ShoppingListItem
+
+TITLE = 'Список покупок:'
+PDF_FONT_NAME = 'ShoppingListFont'
+PDF_CHUNK_SIZE = 64 * 1024
+
+
+class Echo:
+    """File-like object that returns what is written, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def render_txt(rows):
+    yield f'{TITLE}\n'
+    for name, measurement_unit, amount in rows:
+        yield f'{name} {measurement_unit} {amount}\n'
+
+
+def render_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def render_json(rows):
+    yield '['
+    separator = ''
+    for name, measurement_unit, amount in rows:
+        yield separator + json.dumps({
+            'name': name,
+            'measurement_unit': measurement_unit,
+            'amount': amount,
+        }, ensure_ascii=False)
+        separator = ','
+    yield ']'
+
+
+@lru_cache(maxsize=None)
+def get_pdf_font():
+    try:
+        pdfmetrics.registerFont(
+            TTFont(PDF_FONT_NAME, settings.SHOPPING_LIST_PDF_FONT))
+    except Exception:
+        return 'Helvetica'
+    return PDF_FONT_NAME
+
+
+def render_pdf(rows):
+    """Render the list as a PDF, the one format not built row by row.
+
+    reportlab keeps the pages in memory until ``save()`` writes the
+    cross-reference table. The list has one row per ingredient, so the
+    document is bounded by the catalog, not by the number of recipes.
+    """
+    buffer = BytesIO()
+    font = get_pdf_font()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    margin = 50
+    line_height = 18
+
+    pdf.setFont(font, 16)
+    pdf.drawString(margin, height - margin, TITLE)
+    y = height - margin - 2 * line_height
+    pdf.setFont(font, 12)
+    for name, measurement_unit, amount in rows:
+        if y < margin:
+            pdf.showPage()
+            pdf.setFont(font, 12)
+            y = height - margin
+        pdf.drawString(margin, y, f'{name} ({measurement_unit}) — {amount}')
+        y -= line_height
+    pdf.save()
+
+    buffer.seek(0)
+    yield from iter(lambda: buffer.read(PDF_CHUNK_SIZE), b'')
+
+
+EXPORT_FORMATS = {
+    'txt': (render_txt, 'text/plain; charset=utf-8'),
+    'csv': (render_csv, 'text/csv; charset=utf-8'),
+    'json': (render_json, 'application/json'),
+    'pdf': (render_pdf, 'application/pdf'),
+}
+
+
+def get_shopping_list(user):
+    """Return ``(name, measurement_unit, amount)`` rows of the shopping list.
+
+    The list is materialized in ShoppingListItem, so this is a scan of the
+    user's rows joined to their ingredients.
+    """
+    return (
+        ShoppingListItem.objects
+        .filter(user=user)
+        .order_by('ingredient__name', 'ingredient__measurement_unit',
+                  'ingredient_id')
+        .values_list('ingredient__name', 'ingredient__measurement_unit',
+                     'total_amount')
+    )
+
+
+def get_cart_version(user):
+    """Return an ETag seed and Last-Modified value for ``user``'s list.
+
+    The seed includes the ingredient catalog version, since renaming an
+    ingredient or changing its unit changes the list but no item.
+    """
+    state = ShoppingListItem.objects.filter(user=user).aggregate(
+        items=Count('id'),
+        total=Sum('total_amount'),
+        last_modified=Max('updated_at'),
+    )
+    state['ingredients'] = get_version('ingredients')
+    last_modified = state['last_modified']
+    digest = hashlib.md5(json.dumps(
+        state, sort_keys=True, default=str).encode()).hexdigest()
+    return digest, last_modified
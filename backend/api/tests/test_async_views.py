@@ -0,0 +1,63 @@
+import json
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import TransactionTestCase
+from rest_framework.test import (
+    APIClient,
+    APIRequestFactory,
+    force_authenticate
+)
+
+from api import async_views
+from users.models import Recipe, Tag
+from users.seed import seed_dataset
+
+
+class AsyncViewParityTest(TransactionTestCase):
+    """The ASGI views answer like the router's WSGI views.
+
+    TransactionTestCase, because the async views query from a thread
+    of the pool, which does not see the test's open transaction.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = seed_dataset(users=3, recipes=8, ingredients_per_recipe=2,
+                                 favorites=3, cart=2, subscriptions=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.factory = APIRequestFactory()
+
+    def assertSameResponse(self, view, path, **kwargs):
+        expected = self.client.get(path)
+        cache.clear()
+        request = self.factory.get(path)
+        force_authenticate(request, self.user)
+        actual = async_to_sync(view)(request, **kwargs)
+        self.assertEqual(actual.status_code, expected.status_code)
+        self.assertEqual(json.loads(actual.content),
+                         json.loads(expected.content))
+
+    def test_recipe_list(self):
+        self.assertSameResponse(async_views.recipe_list,
+                                '/api/recipes/?limit=5&is_favorited=1')
+
+    def test_recipe_detail(self):
+        recipe_id = Recipe.objects.values_list('id', flat=True).first()
+        self.assertSameResponse(async_views.recipe_detail,
+                                f'/api/recipes/{recipe_id}/', id=recipe_id)
+
+    def test_missing_recipe(self):
+        self.assertSameResponse(async_views.recipe_detail,
+                                '/api/recipes/0/', id=0)
+
+    def test_ingredient_search(self):
+        self.assertSameResponse(async_views.ingredient_list,
+                                '/api/ingredients/?name=аб')
+
+    def test_tags(self):
+        self.assertSameResponse(async_views.tag_list, '/api/tags/')
+        tag_id = Tag.objects.values_list('id', flat=True).first()
+        self.assertSameResponse(async_views.tag_detail,
+                                f'/api/tags/{tag_id}/', id=tag_id)
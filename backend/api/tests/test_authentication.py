@@ -0,0 +1,68 @@
+import base64
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.core.cache import cache
+from django.test import override_settings
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from api import authentication
+from users.models import User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+PASSWORD = 'Old-secret-pass-1'
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class CachedTokenAuthenticationTest(APITestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        authentication.local_cache.clear()
+        self.user = User.objects.create_user(
+            email='cook@example.com', username='cook', first_name='Cook',
+            last_name='Book', password=PASSWORD)
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        # Cache the snapshot, then change the row behind its back as a
+        # write handled by another worker would.
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        User.objects.filter(pk=self.user.pk).update(first_name='Renamed')
+
+    def assertFirstNameKept(self):
+        self.assertEqual(User.objects.get(pk=self.user.pk).first_name,
+                         'Renamed')
+
+    def test_avatar_does_not_save_cached_snapshot(self):
+        buffer = BytesIO()
+        Image.new('RGB', (10, 10), 'red').save(buffer, 'PNG')
+        avatar = ('data:image/png;base64,'
+                  + base64.b64encode(buffer.getvalue()).decode())
+        response = self.client.put('/api/users/me/avatar/',
+                                   {'avatar': avatar}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFirstNameKept()
+
+    def test_set_password_does_not_save_cached_snapshot(self):
+        response = self.client.post(
+            '/api/users/set_password/',
+            {'current_password': PASSWORD,
+             'new_password': 'New-secret-pass-2'},
+            format='json')
+        self.assertEqual(response.status_code, 204)
+        self.assertFirstNameKept()
+        self.assertTrue(User.objects.get(pk=self.user.pk).check_password(
+            'New-secret-pass-2'))
+
+    def test_cached_inactive_user_is_rejected(self):
+        self.user.is_active = False
+        authentication.set_snapshot(self.token.key, self.user)
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
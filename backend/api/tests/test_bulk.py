@@ -0,0 +1,71 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from users import bulk, counters, shopping_list
+from users.models import Recipe, ShoppingCart, ShoppingListItem, User
+from users.seed import seed_dataset
+
+
+class BulkLinksTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_dataset(users=4, recipes=30, ingredients_per_recipe=3,
+                                favorites=0, cart=0, subscriptions=0)
+        cls.recipe_ids = list(Recipe.objects.order_by('id').values_list(
+            'id', flat=True))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def send(self, method, path, ids):
+        response = getattr(self.client, method)(path, {'ids': ids},
+                                                format='json')
+        self.assertEqual(response.status_code, 200)
+        return {item['id']: item['status']
+                for item in response.data['results']}
+
+    def assertConsistent(self):
+        self.assertEqual(sum(counters.reconcile().values()), 0)
+        self.assertEqual(
+            set(ShoppingListItem.objects.values_list(
+                'user_id', 'ingredient_id', 'total_amount')),
+            set(shopping_list.expected_items()))
+
+    def test_add_and_remove_are_idempotent(self):
+        path = '/api/recipes/shopping_cart/'
+        ids = self.recipe_ids[:3]
+        missing = self.recipe_ids[-1] + 1
+        self.assertEqual(self.send('post', path, ids + [missing]),
+                         {**dict.fromkeys(ids, bulk.ADDED),
+                          missing: bulk.NOT_FOUND})
+        self.assertEqual(self.send('post', path, ids),
+                         dict.fromkeys(ids, bulk.EXISTS))
+        self.assertConsistent()
+        self.assertEqual(self.send('delete', path, ids[:2]),
+                         dict.fromkeys(ids[:2], bulk.REMOVED))
+        self.assertEqual(self.send('delete', path, ids[:2]),
+                         dict.fromkeys(ids[:2], bulk.ABSENT))
+        self.assertEqual(
+            list(ShoppingCart.objects.filter(user=self.user).values_list(
+                'recipe_id', flat=True)), ids[2:])
+        self.assertConsistent()
+
+    def test_query_count_does_not_depend_on_ids(self):
+        path = '/api/recipes/favorite/'
+        with CaptureQueriesContext(connection) as queries:
+            self.send('post', path, self.recipe_ids[:2])
+        with self.assertNumQueries(len(queries)):
+            self.send('post', path, self.recipe_ids[2:])
+        self.assertConsistent()
+
+    def test_own_subscription_is_skipped(self):
+        author = User.objects.exclude(pk=self.user.pk).first()
+        self.assertEqual(
+            self.send('post', '/api/users/subscribe/',
+                      [self.user.pk, author.pk]),
+            {self.user.pk: bulk.OWN, author.pk: bulk.ADDED})
+        self.assertConsistent()
@@ -0,0 +1,42 @@
+from unittest import mock
+
+from django.core.signals import request_started
+from django.db import connection, transaction
+from django.test import TransactionTestCase, override_settings
+
+from foodgram_backend import db
+
+
+class ConnectionHealthCheckTest(TransactionTestCase):
+
+    def setUp(self):
+        connection.ensure_connection()
+        # The in-memory test database ignores close(); watch the call.
+        patcher = mock.patch.object(connection, 'close')
+        self.close = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_broken_connection_is_closed(self):
+        with mock.patch.object(connection, 'is_usable', return_value=False):
+            db.check_connections()
+        self.close.assert_called_once_with()
+
+    def test_working_connection_is_kept(self):
+        db.check_connections()
+        self.close.assert_not_called()
+
+    def test_connection_in_transaction_is_not_checked(self):
+        with transaction.atomic(), \
+                mock.patch.object(connection, 'is_usable') as is_usable:
+            db.check_connections()
+        is_usable.assert_not_called()
+
+    @override_settings(CONN_HEALTH_CHECKS=True)
+    def test_checked_when_a_request_starts(self):
+        db.connect()
+        self.addCleanup(request_started.disconnect,
+                        dispatch_uid='check_connections')
+        with mock.patch.object(connection, 'is_usable',
+                               return_value=True) as is_usable:
+            request_started.send(sender=self.__class__)
+        is_usable.assert_called_once_with()
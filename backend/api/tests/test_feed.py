@@ -0,0 +1,79 @@
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from users import feed
+from users.models import FeedItem, Recipe, User
+
+
+class FeedTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.bulk_create(
+            User(username=name, email=f'{name}@example.com')
+            for name in ('reader', 'author', 'other'))
+        cls.reader, cls.author, cls.other = User.objects.order_by('id')
+        for author in (cls.author, cls.other):
+            for i in range(feed.BACKFILL_SIZE + 2):
+                cls.create_recipe(author, f'{author.username} {i}')
+
+    @classmethod
+    def create_recipe(cls, author, name):
+        return Recipe.objects.create(
+            author=author, name=name, text='Текст.', cooking_time=5,
+            image='recipes/image/a.png', fanned_out=feed.fans_out(author))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.reader)
+
+    def subscribe(self, author):
+        response = self.client.post(f'/api/users/{author.pk}/subscribe/')
+        self.assertEqual(response.status_code, 201)
+
+    def read_feed(self):
+        ids = []
+        url = '/api/recipes/feed/?limit=10'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def latest(self, author, count):
+        return list(Recipe.objects.filter(author=author)
+                    .order_by('-pub_date', '-id')
+                    .values_list('id', flat=True)[:count])
+
+    def test_subscribe_backfills_latest_recipes(self):
+        self.subscribe(self.author)
+        self.assertEqual(self.read_feed(),
+                         self.latest(self.author, feed.BACKFILL_SIZE))
+
+    def test_new_recipe_is_pushed_to_followers(self):
+        self.subscribe(self.author)
+        recipe = self.create_recipe(self.author, 'Новый')
+        feed.publish(recipe)
+        self.assertEqual(self.read_feed()[0], recipe.pk)
+
+    def test_unsubscribe_forgets_the_author(self):
+        self.subscribe(self.author)
+        self.subscribe(self.other)
+        response = self.client.delete(
+            f'/api/users/{self.author.pk}/subscribe/')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(FeedItem.objects.filter(
+            user=self.reader, author=self.author).exists())
+        self.assertEqual(self.read_feed(),
+                         self.latest(self.other, feed.BACKFILL_SIZE))
+
+    @override_settings(FEED_FAN_OUT_LIMIT=0)
+    def test_recipes_of_popular_authors_are_pulled(self):
+        self.subscribe(self.author)
+        self.author.refresh_from_db()
+        recipe = self.create_recipe(self.author, 'Новый')
+        self.assertFalse(recipe.fanned_out)
+        self.assertEqual(feed.publish(recipe), 0)
+        self.assertEqual(self.read_feed()[0], recipe.pk)
@@ -0,0 +1,59 @@
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from api.cache import bump_version
+from api.ingredient_search import prefix_cache
+from users.models import Ingredient
+
+
+class IngredientSearchCacheTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        prefix_cache.clear()
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+
+    def names(self, term):
+        response = self.client.get('/api/ingredients/', {'name': term})
+        self.assertEqual(response.status_code, 200)
+        return [ingredient['name'] for ingredient in response.data]
+
+    def test_change_from_another_process_is_served(self):
+        self.assertEqual(self.names('с'), ['соль'])
+        # No signal reaches this process, only the shared version bump.
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='сахар', measurement_unit='г')])
+        bump_version('ingredients')
+        self.assertEqual(self.names('с'), ['сахар', 'соль'])
+
+
+class IngredientSearchRankingTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('сыр', 'творожный сыр', 'сырок', 'масло',
+                         'сырники'))
+
+    def setUp(self):
+        cache.clear()
+        prefix_cache.clear()
+
+    def names(self, term, **params):
+        response = self.client.get('/api/ingredients/',
+                                   {'name': term, **params})
+        self.assertEqual(response.status_code, 200)
+        return [ingredient['name'] for ingredient in response.data]
+
+    def test_prefix_matches_come_before_substring_matches(self):
+        self.assertEqual(self.names('сыр'),
+                         ['сыр', 'сырники', 'сырок', 'творожный сыр'])
+
+    def test_short_term_matches_prefixes_only(self):
+        self.assertEqual(self.names('сы'), ['сыр', 'сырники', 'сырок'])
+
+    @override_settings(INGREDIENT_SEARCH_LIMIT=2)
+    def test_limit_is_filled_with_prefix_matches_first(self):
+        self.assertEqual(self.names('сыр'), ['сыр', 'сырники'])
@@ -0,0 +1,69 @@
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+
+from users.models import Recipe, User
+from users.seed import seed_dataset
+
+
+class CachedCountPaginationTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.create_users(0, 5)
+
+    def create_users(self, start, stop):
+        User.objects.bulk_create(
+            User(username=f'user{i}', email=f'user{i}@example.com')
+            for i in range(start, stop))
+
+    def get_page(self, page):
+        return self.client.get('/api/users/', {'page': page, 'limit': 2})
+
+    def test_fresh_count_is_exact(self):
+        response = self.get_page(1)
+        self.assertEqual(response.data['count'], 5)
+        self.assertTrue(response.data['count_exact'])
+
+    def test_pages_past_a_cached_count(self):
+        self.get_page(1)
+        self.create_users(5, 9)
+        response = self.get_page(4)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data['count_exact'])
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+        response = self.get_page(5)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 9)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(self.get_page(6).status_code, 404)
+
+
+class RecipeCursorPaginationTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_dataset(users=2, recipes=7, ingredients_per_recipe=1,
+                                favorites=0, cart=0, subscriptions=0)
+
+    def setUp(self):
+        cache.clear()
+
+    def add_recipe(self):
+        Recipe.objects.create(author=self.user, name='Новый', text='Текст.',
+                              image='recipes/image/new.png', cooking_time=5)
+
+    def test_pages_stay_stable_while_rows_are_inserted(self):
+        expected = list(Recipe.objects.order_by(
+            '-pub_date', '-id').values_list('id', flat=True))
+        seen = []
+        url = '/api/recipes/?pagination=cursor&limit=3'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            seen += [recipe['id'] for recipe in response.data['results']]
+            url = response.data['next']
+            self.add_recipe()
+        self.assertEqual(seen, expected)
@@ -0,0 +1,76 @@
+import json
+import re
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from foodgram_backend import profiling
+from users.seed import seed_dataset
+
+MIDDLEWARE = ['foodgram_backend.profiling.ProfilingMiddleware',
+              *settings.MIDDLEWARE]
+LOG_FILE = str(Path(tempfile.mkdtemp()) / 'profiling.log')
+
+
+def metrics(response):
+    return set(re.findall(r'(?:^|, )(\w+);', response['Server-Timing']))
+
+
+@override_settings(MIDDLEWARE=MIDDLEWARE, PROFILING_LOG_FILE=LOG_FILE,
+                   PROFILING_SAMPLE_RATE=0)
+class ProfilingMiddlewareTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_dataset(users=3, recipes=10, ingredients_per_recipe=3,
+                                favorites=2, cart=2, subscriptions=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_header_only_for_staff(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/recipes/'))
+        self.client.force_authenticate(self.user)
+        self.assertNotIn('Server-Timing', self.client.get('/api/recipes/'))
+        self.user.is_staff = True
+        self.assertIn('Server-Timing', self.client.get('/api/recipes/'))
+
+    def test_phase_breakdown(self):
+        self.user.is_staff = True
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(metrics(response), {
+            'total', 'auth', 'permission', 'filter', 'query', 'serialize',
+            'render', 'db'})
+
+    def test_unsampled_request_records_no_queries(self):
+        with mock.patch.object(profiling.Profile, '__call__') as record, \
+                mock.patch.object(profiling.logger, 'info') as log:
+            self.client.get('/api/recipes/')
+        record.assert_not_called()
+        log.assert_not_called()
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_sampled_request_is_logged_without_header(self):
+        with self.assertLogs('foodgram.profiling') as logs:
+            response = self.client.get('/api/recipes/')
+        self.assertNotIn('Server-Timing', response)
+        report = json.loads(logs.records[0].getMessage())
+        self.assertEqual(report['status'], 200)
+        self.assertGreater(report['queries'], 0)
+        self.assertIn('query', report['phases_ms'])
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_streamed_body_is_logged_when_consumed(self):
+        self.client.force_authenticate(self.user)
+        with mock.patch.object(profiling.logger, 'info') as log:
+            response = self.client.get(
+                '/api/recipes/download_shopping_cart/')
+            log.assert_not_called()
+            b''.join(response.streaming_content)
+        log.assert_called_once()
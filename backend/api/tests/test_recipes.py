@@ -0,0 +1,193 @@
+import base64
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APITestCase
+
+from api.views import RecipeViewSet
+from users.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.seed import seed_dataset
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def image_data():
+    buffer = BytesIO()
+    Image.new('RGB', (10, 10), 'red').save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+class RecipeListQueriesTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_dataset(users=5, recipes=30, ingredients_per_recipe=3,
+                                favorites=5, cart=5, subscriptions=2)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        cache.clear()
+
+    def get_page(self, limit):
+        response = self.client.get('/api/recipes/', {'limit': limit})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), limit)
+        return response
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.get_page(3)
+        cache.clear()
+        with self.assertNumQueries(len(queries)):
+            self.get_page(20)
+
+    def test_user_flags_come_from_page_query(self):
+        results = self.get_page(30).data['results']
+        favorited = {recipe['id'] for recipe in results
+                     if recipe['is_favorited']}
+        in_cart = {recipe['id'] for recipe in results
+                   if recipe['is_in_shopping_cart']}
+        self.assertEqual(favorited, set(self.user.favorite_set.values_list(
+            'recipe_id', flat=True)))
+        self.assertEqual(in_cart, set(self.user.shopping_carts.values_list(
+            'recipe_id', flat=True)))
+
+
+class RecipeDetailTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_dataset(users=2, recipes=3, ingredients_per_recipe=2,
+                                favorites=1, cart=1, subscriptions=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_recipe_deleted_after_lookup_is_not_found(self):
+        recipe = Recipe.objects.with_user_flags(self.user).first()
+        Recipe.objects.filter(pk=recipe.pk).delete()
+        with mock.patch.object(RecipeViewSet, 'get_object',
+                               return_value=recipe):
+            response = self.client.get(f'/api/recipes/{recipe.pk}/')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeWriteTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_dataset(users=1, recipes=0, favorites=0, cart=0,
+                                subscriptions=0)
+        cls.ingredient_ids = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True))
+        cls.tag_id = Tag.objects.values_list('id', flat=True).first()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def payload(self, amounts):
+        return {
+            'ingredients': [{'id': pk, 'amount': amount}
+                            for pk, amount in amounts.items()],
+            'tags': [self.tag_id],
+            'image': image_data(),
+            'name': 'Окрошка',
+            'text': 'Нарезать и залить.',
+            'cooking_time': 15,
+        }
+
+    def create(self, amounts):
+        return self.client.post('/api/recipes/', self.payload(amounts),
+                                format='json')
+
+    def amounts(self, count, amount=10):
+        return {pk: amount for pk in self.ingredient_ids[:count]}
+
+    def test_create_query_count_does_not_depend_on_ingredients(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.create(self.amounts(2)).status_code, 201)
+        with self.assertNumQueries(len(queries)):
+            self.assertEqual(self.create(self.amounts(40)).status_code, 201)
+
+    def test_duplicate_ingredient_ids_are_rejected(self):
+        payload = self.payload(self.amounts(2))
+        payload['ingredients'].append(dict(payload['ingredients'][0]))
+        response = self.client.post('/api/recipes/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ingredients', response.data)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_unknown_ingredient_is_rejected(self):
+        response = self.create({0: 10})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_update_touches_only_changed_rows(self):
+        recipe_id = self.create(self.amounts(3)).data['id']
+        kept, changed, removed = RecipeIngredient.objects.filter(
+            recipe_id=recipe_id).order_by('ingredient_id')
+        added = self.ingredient_ids[3]
+        response = self.client.patch(
+            f'/api/recipes/{recipe_id}/',
+            self.payload({kept.ingredient_id: kept.amount,
+                          changed.ingredient_id: 99, added: 5}),
+            format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            set(RecipeIngredient.objects.filter(recipe_id=recipe_id)
+                .values_list('id', 'ingredient_id', 'amount')
+                .exclude(ingredient_id=added)),
+            {(kept.id, kept.ingredient_id, kept.amount),
+             (changed.id, changed.ingredient_id, 99)})
+        self.assertTrue(RecipeIngredient.objects.filter(
+            recipe_id=recipe_id, ingredient_id=added, amount=5).exists())
+        self.assertFalse(RecipeIngredient.objects.filter(
+            pk=removed.pk).exists())
+
+
+class RecipeTagFilterTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(users=2, recipes=10, ingredients_per_recipe=1,
+                     favorites=0, cart=0, subscriptions=0)
+        cls.slugs = list(Tag.objects.values_list('slug', flat=True)[:2])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_multiple_tags_return_each_recipe_once(self):
+        expected = set(Recipe.objects.filter(
+            tags__slug__in=self.slugs).values_list('id', flat=True))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/recipes/',
+                                       {'tags': self.slugs, 'limit': 100})
+        self.assertEqual(response.status_code, 200)
+        ids = [recipe['id'] for recipe in response.data['results']]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(set(ids), expected)
+        self.assertEqual(response.data['count'], len(expected))
+        self.assertFalse(any('DISTINCT' in query['sql']
+                             for query in queries.captured_queries))
+
+    def test_new_tag_is_accepted_without_restart(self):
+        self.client.get('/api/recipes/', {'tags': self.slugs})
+        Tag.objects.create(name='Новый', slug='new')
+        response = self.client.get('/api/recipes/', {'tags': 'new'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [])
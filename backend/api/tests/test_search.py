@@ -0,0 +1,69 @@
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from rest_framework.test import APITestCase
+
+from users import search
+from users.models import Ingredient, Recipe, RecipeIngredient
+from users.seed import seed_dataset
+
+
+class RecipeSearchTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(users=2, recipes=5, ingredients_per_recipe=2,
+                     favorites=0, cart=0, subscriptions=0)
+        cls.soup, cls.pie = Recipe.objects.order_by('id')[:2]
+        Recipe.objects.filter(pk=cls.soup.pk).update(
+            name='Борщ', text='Суп со свёклой.')
+        Recipe.objects.filter(pk=cls.pie.pk).update(
+            name='Пирог', text='Почти Борщ, только пирог.')
+        search.update_search_vectors()
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, text, **params):
+        return self.client.get('/api/recipes/', {'search': text, **params})
+
+    def result_ids(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_matches_name_and_text(self):
+        self.assertEqual(set(self.result_ids(self.search('Борщ'))),
+                         {self.soup.pk, self.pie.pk})
+
+    def test_cursor_pagination_is_rejected(self):
+        response = self.search('Борщ', pagination='cursor')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('search', response.data)
+
+    def test_ingredient_rename_refreshes_its_recipes(self):
+        ingredient = Ingredient.objects.get(
+            pk=self.soup.ingredients_in_recipe.first().ingredient_id)
+        ingredient.name = 'свёкла'
+        with mock.patch.object(search, 'update_search_vectors') as update:
+            ingredient.save()
+        self.assertEqual(
+            set(update.call_args.args[0]),
+            set(RecipeIngredient.objects.filter(
+                ingredient=ingredient).values_list('recipe_id', flat=True)))
+
+    @skipUnless(connection.vendor == 'postgresql', 'Full-text search.')
+    def test_name_match_ranks_first(self):
+        self.assertEqual(self.result_ids(self.search('Борщ'))[:2],
+                         [self.soup.pk, self.pie.pk])
+
+    @skipUnless(connection.vendor == 'postgresql', 'Full-text search.')
+    def test_renamed_ingredient_is_found(self):
+        row = self.pie.ingredients_in_recipe.first()
+        Ingredient.objects.filter(pk=row.ingredient_id).update(
+            name='Черемша')
+        self.assertNotIn(self.pie.pk,
+                         self.result_ids(self.search('черемша')))
+        ingredient = Ingredient.objects.get(pk=row.ingredient_id)
+        ingredient.save()
+        self.assertIn(self.pie.pk, self.result_ids(self.search('черемша')))
@@ -0,0 +1,122 @@
+import csv
+import json
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APITestCase
+
+from api.shopping_list import get_shopping_list
+from users import shopping_list
+from users.models import (
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    ShoppingListItem
+)
+from users.seed import seed_dataset
+
+
+class ShoppingListDeleteTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(users=6, recipes=40, ingredients_per_recipe=4,
+                     favorites=2, cart=8, subscriptions=2)
+
+    def assertListsMatchCarts(self):
+        self.assertEqual(
+            set(ShoppingListItem.objects.values_list(
+                'user_id', 'ingredient_id', 'total_amount')),
+            set(shopping_list.expected_items()))
+
+    def carted_recipes(self):
+        return Recipe.objects.filter(pk__in=ShoppingCart.objects.values(
+            'recipe_id'))
+
+    def test_recipes_deleted_outside_the_api(self):
+        Recipe.objects.filter(
+            pk__in=list(self.carted_recipes().values_list('pk', flat=True)[:3])
+        ).delete()
+        self.assertListsMatchCarts()
+
+    def test_author_deleted(self):
+        self.carted_recipes().first().author.delete()
+        self.assertListsMatchCarts()
+
+
+class ShoppingListExportTest(APITestCase):
+    url = '/api/recipes/download_shopping_cart/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_dataset(users=3, recipes=20, ingredients_per_recipe=4,
+                                favorites=2, cart=5, subscriptions=1)
+        cls.rows = list(get_shopping_list(cls.user))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def download(self, export_format, **headers):
+        response = self.client.get(self.url, {'format': export_format},
+                                   **headers)
+        if response.status_code == 200:
+            response.body = b''.join(response.streaming_content)
+        return response
+
+    def test_formats(self):
+        self.assertTrue(self.rows)
+        self.assertEqual(self.rows, sorted(self.rows))
+        text = self.download('txt').body.decode().splitlines()
+        self.assertEqual(text[1:], [f'{name} {unit} {amount}'
+                                    for name, unit, amount in self.rows])
+        table = list(csv.reader(StringIO(self.download('csv').body.decode())))
+        self.assertEqual(table[1:], [[name, unit, str(amount)]
+                                     for name, unit, amount in self.rows])
+        items = json.loads(self.download('json').body)
+        self.assertEqual([tuple(item.values()) for item in items], self.rows)
+        response = self.download('pdf')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response.body.startswith(b'%PDF'))
+
+    def test_repeat_download_is_not_modified(self):
+        etag = self.download('txt')['ETag']
+        self.assertEqual(
+            self.download('txt', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertNotEqual(self.download('csv')['ETag'], etag)
+
+    def test_ingredient_rename_changes_etag(self):
+        etag = self.download('txt')['ETag']
+        ingredient = Ingredient.objects.filter(
+            shoppinglistitem__user=self.user).first()
+        ingredient.name = 'переименованный'
+        ingredient.save()
+        response = self.download('txt', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('переименованный', response.body.decode())
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'INCLUDE indexes are PostgreSQL only')
+class ShoppingListIndexTest(TransactionTestCase):
+
+    def setUp(self):
+        # 12,500 recipes with 8 ingredients: 100k RecipeIngredient rows.
+        self.user = seed_dataset(users=5, recipes=12500,
+                                 ingredients_per_recipe=8, favorites=2,
+                                 cart=5, subscriptions=1)
+        with connection.cursor() as cursor:
+            # Marks the pages all-visible, as autovacuum would.
+            cursor.execute(
+                f'VACUUM ANALYZE {RecipeIngredient._meta.db_table}')
+
+    def test_amounts_are_read_from_covering_index(self):
+        self.assertEqual(RecipeIngredient.objects.count(), 100000)
+        recipe_ids = list(ShoppingCart.objects.filter(
+            user=self.user).values_list('recipe_id', flat=True))
+        plan = shopping_list.amounts_queryset(recipe_ids).explain()
+        self.assertIn('Index Only Scan using recipeingredient_cart_idx', plan)
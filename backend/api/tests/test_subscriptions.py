@@ -0,0 +1,47 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from users import bulk
+from users.models import Recipe, Subscription, User
+from users.seed import seed_dataset
+
+
+class SubscriptionListTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_dataset(users=8, recipes=60, ingredients_per_recipe=1,
+                                favorites=0, cart=0, subscriptions=0)
+        cls.authors = list(User.objects.exclude(pk=cls.user.pk)
+                           .order_by('id').values_list('id', flat=True))
+        bulk.add(Subscription, cls.user, cls.authors)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def get_page(self, limit, recipes_limit=2):
+        response = self.client.get('/api/users/subscriptions/',
+                                   {'limit': limit,
+                                    'recipes_limit': recipes_limit})
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_latest_recipes_per_author(self):
+        for author in self.get_page(limit=len(self.authors)):
+            latest = list(Recipe.objects.filter(author_id=author['id'])
+                          .order_by('-pub_date', '-id')
+                          .values_list('id', flat=True))
+            self.assertTrue(author['is_subscribed'])
+            self.assertEqual(author['recipes_count'], len(latest))
+            self.assertEqual([recipe['id'] for recipe in author['recipes']],
+                             latest[:2])
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.get_page(limit=2)
+        cache.clear()
+        with self.assertNumQueries(len(queries)):
+            self.get_page(limit=len(self.authors))
@@ -1,5 +1,7 @@
-from django.urls import include, path
+from django.conf import settings
+from django.urls import include, path, re_path
 from rest_framework import routers
+from api import async_views
 from api.views import (
     CustomUserViewSet,
     TagViewSet,
@@ -17,3 +19,17 @@ urlpatterns = [
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
 ]
+
+if settings.ASYNC_READ_VIEWS:
+    urlpatterns = [
+        path('recipes/', async_views.recipe_list, name='recipes-list'),
+        # Numeric only, so list actions such as recipes/feed/ reach
+        # the router.
+        re_path(r'^recipes/(?P<id>\d+)/$', async_views.recipe_detail,
+                name='recipes-detail'),
+        path('ingredients/', async_views.ingredient_list,
+             name='ingredients-list'),
+        path('tags/', async_views.tag_list, name='tags-list'),
+        re_path(r'^tags/(?P<id>[^/.]+)/$', async_views.tag_detail,
+                name='tags-detail'),
+    ] + urlpatterns
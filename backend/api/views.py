@@ -1,10 +1,17 @@
+import calendar
+from collections import defaultdict
+
 from rest_framework import viewsets, status
-from django.db.models import Sum, Count
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BooleanField, Value
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import NotFound, ValidationError
 from djoser.serializers import SetPasswordSerializer
 from django.shortcuts import get_object_or_404
 from django.contrib.auth import get_user_model
@@ -22,10 +29,23 @@ from users.serializers import (
     RetrieveSubscriptionSerializer,
     FavoriteSerializer,
     ShoppingCartSerializer,
-    CreateSubscriptionSerializer
+    CreateSubscriptionSerializer,
+    BulkIdsSerializer
 )
+from api.pagination import FeedPagination, PageNumberOrCursorPagination
 from api.permissions import IsAuthorOrReadOnly
-from api.filters import IngredientFilter, RecipeFilter
+from api.recipe_cache import serialize_recipes
+from api.renderers import SHOPPING_LIST_RENDERERS
+from api.shopping_list import (
+    EXPORT_FORMATS,
+    get_cart_version,
+    get_shopping_list
+)
+from api.cache import CachedResponseMixin
+from api.filters import RecipeFilter
+from api.ingredient_search import search_ingredients
+from users import bulk, feed, shopping_list
+from users.similarity import similar_recipe_ids
 from users.models import (
     Subscription,
     Tag,
@@ -38,9 +58,23 @@ from users.models import (
 User = get_user_model()
 
 
+def bulk_response(request, model):
+    """Add (POST) or remove (DELETE) links to ``{"ids": [...]}`` and
+    report the outcome for each id."""
+    serializer = BulkIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    apply = bulk.add if request.method == 'POST' else bulk.remove
+    outcomes = apply(model, request.user, serializer.validated_data['ids'])
+    return Response({'results': [
+        {'id': pk, 'status': outcome} for pk, outcome in outcomes.items()
+    ]})
+
+
 class CustomUserViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.all()
+    queryset = User.objects.order_by('id')
     permission_classes = [AllowAny]
+    pagination_class = PageNumberOrCursorPagination
+    cursor_ordering = ('id',)
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -52,8 +86,10 @@ class CustomUserViewSet(viewsets.ModelViewSet):
     @action(methods=['PUT', 'DELETE'],
             detail=False, url_path='me/avatar',
             permission_classes=[IsAuthenticated])
+    @transaction.atomic
     def avatar(self, request):
-        user = request.user
+        # request.user may be a cached snapshot; save a current row.
+        user = User.objects.select_for_update().get(pk=request.user.pk)
         if request.method == 'PUT':
             serializer = AvatarSerializer(user, data=request.data)
             if serializer.is_valid():
@@ -78,31 +114,40 @@ class CustomUserViewSet(viewsets.ModelViewSet):
             serializer.save(user=user, author=author)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         if request.method == 'DELETE':
-            try:
-                is_subscribed = Subscription.objects.get(author_id=author.id)
-            except Subscription.DoesNotExist:
+            removed = bulk.remove(Subscription, user, [author.id])
+            if removed[author.id] != bulk.REMOVED:
                 return Response(
                     {"detail": "Вы не были подписаны на пользователя"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            is_subscribed.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(methods=['POST', 'DELETE'], detail=False, url_path='subscribe',
+            permission_classes=[IsAuthenticated])
+    def subscribe_bulk(self, request):
+        return bulk_response(request, Subscription)
+
     @action(methods=['GET'], detail=False,
             permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
         user = request.user
         recipes_limit = request.query_params.get('recipes_limit')
-        context = {'request': request}
         if recipes_limit and recipes_limit.isdigit():
-            context['recipes_limit'] = int(recipes_limit)
+            recipes_limit = int(recipes_limit)
+        else:
+            recipes_limit = None
 
-        authors = User.objects.filter(
-            authors__user=user
-        ).annotate(
-            recipes_count=Count('recipe_author')
-        )
+        authors = User.objects.filter(authors__user=user).annotate(
+            subscribed=Value(True, output_field=BooleanField())
+        ).order_by('id')
         page = self.paginate_queryset(authors)
+        recipes = defaultdict(list)
+        for recipe in Recipe.objects.latest_by_author(
+                [author.id for author in page], recipes_limit).only(
+                'id', 'author_id', 'name', 'image', 'image_srcset',
+                'cooking_time'):
+            recipes[recipe.author_id].append(recipe)
+        context = {'request': request, 'recipes': recipes}
         serializer = RetrieveSubscriptionSerializer(page,
                                                     many=True, context=context)
         return self.get_paginated_response(serializer.data)
@@ -123,14 +168,15 @@ class CustomUserViewSet(viewsets.ModelViewSet):
         )
         serializer.is_valid(raise_exception=True)
 
-        user = request.user
+        user = User.objects.get(pk=request.user.pk)
         user.set_password(serializer.validated_data['new_password'])
-        user.save()
+        user.save(update_fields=['password'])
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
+    cache_namespace = 'tags'
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = [AllowAny]
@@ -138,13 +184,19 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     lookup_field = 'id'
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(CachedResponseMixin, viewsets.ModelViewSet):
+    cache_namespace = 'ingredients'
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = [AllowAny]
     pagination_class = None
-    filter_backends = [DjangoFilterBackend]
-    filterset_class = IngredientFilter
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(self.search, request)
+
+    def search(self, request):
+        return Response(
+            search_ingredients(request.query_params.get('name', '')))
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
@@ -153,15 +205,38 @@ class RecipeViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthorOrReadOnly]
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
+    pagination_class = PageNumberOrCursorPagination
+    cursor_ordering = ('-pub_date', '-id')
     lookup_field = 'id'
 
+    def get_queryset(self):
+        return Recipe.objects.with_user_flags(self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                serialize_recipes(page, request))
+        return Response(serialize_recipes(queryset, request))
+
+    def retrieve(self, request, *args, **kwargs):
+        data = serialize_recipes([self.get_object()], request)
+        if not data:
+            # Deleted after get_object(), before its cache miss was loaded.
+            raise NotFound
+        return Response(data[0])
+
     def get_serializer_class(self):
         if self.action in ['list', 'retrieve']:
             return RetrieveRecipeSerializer
         return CreateRecipeSerializer
 
+    @transaction.atomic
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        author = self.request.user
+        feed.publish(serializer.save(author=author,
+                                     fanned_out=feed.fans_out(author)))
 
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', False)
@@ -170,10 +245,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
                                          data=request.data, partial=partial)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
-        read_serializer = RetrieveRecipeSerializer(
-            serializer.instance,
-            context={'request': request})
-        return Response(read_serializer.data)
+        return Response(serializer.data)
 
     @action(methods=['POST', 'DELETE'], detail=True)
     def favorite(self, request, id=None):
@@ -193,14 +265,17 @@ class RecipeViewSet(viewsets.ModelViewSet):
                                           context={'request': request}).data,
                 status=status.HTTP_201_CREATED)
         if request.method == 'DELETE':
-            try:
-                recipe_in_favorite = Favorite.objects.get(recipe_id=recipe.id)
-            except Favorite.DoesNotExist:
+            removed = bulk.remove(Favorite, request.user, [recipe.id])
+            if removed[recipe.id] != bulk.REMOVED:
                 return Response({"detail": "Рецепта нет в избранном"},
                                 status=status.HTTP_400_BAD_REQUEST)
-            recipe_in_favorite.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(methods=['POST', 'DELETE'], detail=False, url_path='favorite',
+            permission_classes=[IsAuthenticated])
+    def favorite_bulk(self, request):
+        return bulk_response(request, Favorite)
+
     @action(methods=['POST', 'DELETE'], detail=True)
     def shopping_cart(self, request, id=None):
         recipe = get_object_or_404(Recipe, id=id)
@@ -215,49 +290,83 @@ class RecipeViewSet(viewsets.ModelViewSet):
                     {"detail": "Рецепт уже есть в списке покупок"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
+                shopping_list.add_recipe(request.user, recipe)
             return Response(
                 RecipeShortInfoSerializer(recipe,
                                           context={'request': request}).data,
                 status=status.HTTP_201_CREATED
             )
         if request.method == 'DELETE':
-            try:
-                recipe_in_shopping_cart = ShoppingCart.objects.get(
-                    recipe_id=recipe.id)
-            except ShoppingCart.DoesNotExist:
+            removed = bulk.remove(ShoppingCart, request.user, [recipe.id])
+            if removed[recipe.id] != bulk.REMOVED:
                 return Response(
                     {"detail": "Рецепта нет в списке покупок"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            recipe_in_shopping_cart.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(methods=['POST', 'DELETE'], detail=False,
+            url_path='shopping_cart', permission_classes=[IsAuthenticated])
+    def shopping_cart_bulk(self, request):
+        return bulk_response(request, ShoppingCart)
+
     @action(methods=['GET'], detail=False,
-            permission_classes=[IsAuthenticated])
+            permission_classes=[IsAuthenticated],
+            renderer_classes=SHOPPING_LIST_RENDERERS)
     def download_shopping_cart(self, request):
-        ingredients = (
-            ShoppingCart.objects
-            .filter(user=request.user)
-            .values('recipe__ingredients__name',
-                    'recipe__ingredients__measurement_unit')
-            .annotate(total_amount=Sum(
-                'recipe__ingredients_in_recipe__amount'))
-        )
-        content = 'Список покупок:\n'
-        for ingredient in ingredients:
-            content += (
-                f'{ingredient["recipe__ingredients__name"]} '
-                f'{ingredient["recipe__ingredients__measurement_unit"]} '
-                f'{ingredient["total_amount"]}\n'
-            )
-        response = HttpResponse(content, content_type='text/plain')
-        response['Content-Disposition'] = ('attachment;'
-                                           'filename="shopping_list.txt"')
+        export_format = request.accepted_renderer.format
+        digest, last_modified = get_cart_version(request.user)
+        etag = quote_etag(f'{digest}-{export_format}')
+        timestamp = (calendar.timegm(last_modified.utctimetuple())
+                     if last_modified else None)
+        # Only the ETag is compared: catalog changes do not move
+        # Last-Modified, so If-Modified-Since alone could serve a stale
+        # list.
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            ingredients = get_shopping_list(request.user)
+            render, content_type = EXPORT_FORMATS[export_format]
+            response = StreamingHttpResponse(
+                render(ingredients.iterator()), content_type=content_type)
+            response['Content-Disposition'] = (
+                f'attachment; filename="shopping_list.{export_format}"')
+        response['ETag'] = etag
+        if timestamp:
+            response['Last-Modified'] = http_date(timestamp)
+        response['Cache-Control'] = 'private, no-cache'
         return response
 
+    @action(methods=['GET'], detail=False,
+            permission_classes=[IsAuthenticated],
+            pagination_class=FeedPagination)
+    def feed(self, request):
+        keys = self.paginator.paginate_keys(
+            lambda position, limit: feed.read(request.user, position, limit),
+            request)
+        ids = [pk for _, pk in keys]
+        recipes = self.get_queryset().in_bulk(ids)
+        return self.paginator.get_paginated_response(serialize_recipes(
+            [recipes[pk] for pk in ids if pk in recipes], request))
+
+    @action(methods=['GET'], detail=True, permission_classes=[AllowAny])
+    def similar(self, request, id=None):
+        limit = request.query_params.get('limit')
+        if limit and limit.isdigit():
+            limit = min(int(limit), settings.SIMILAR_RECIPES_COUNT)
+        else:
+            limit = settings.SIMILAR_RECIPES_LIMIT
+        ids = similar_recipe_ids(id, limit)
+        if not ids:
+            get_object_or_404(Recipe, id=id)
+            return Response([])
+        recipes = self.get_queryset().in_bulk(ids)
+        return Response(serialize_recipes(
+            [recipes[pk] for pk in ids if pk in recipes], request))
+
     @action(methods=['GET'], detail=True, url_path='get-link')
-    def get_link(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, pk=pk)
+    def get_link(self, request, id=None):
+        recipe = get_object_or_404(Recipe, id=id)
         short_link = request.build_absolute_uri(f'/recipes/{recipe.id}/')
         return Response({'short-link': short_link})
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+
+
+def check_connections(**kwargs):
+    """Drop persistent connections that stopped working between requests.
+
+    With CONN_MAX_AGE a connection can outlive a database restart or a
+    pooler closing it; Django 3.2 only notices after a query fails.
+    """
+    for connection in connections.all():
+        if (connection.connection is not None
+                and not connection.in_atomic_block
+                and not connection.is_usable()):
+            connection.close()
+
+
+def connect():
+    if settings.CONN_HEALTH_CHECKS:
+        request_started.connect(check_connections,
+                                dispatch_uid='check_connections')
@@ -0,0 +1,275 @@
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models.query import QuerySet
+from rest_framework.generics import GenericAPIView
+from rest_framework.response import Response
+from rest_framework.serializers import ListSerializer, Serializer
+from rest_framework.views import APIView
+
+logger = logging.getLogger('foodgram.profiling')
+
+# Profile of the request being handled; None outside ProfilingMiddleware.
+current = ContextVar('profile', default=None)
+
+# (class, method, phase) timed while a request is profiled.
+PHASE_HOOKS = (
+    (APIView, 'perform_authentication', 'auth'),
+    (APIView, 'check_permissions', 'permission'),
+    (APIView, 'check_object_permissions', 'permission'),
+    (GenericAPIView, 'filter_queryset', 'filter'),
+    (QuerySet, '_fetch_all', 'query'),
+    (QuerySet, 'count', 'query'),
+    (QuerySet, 'exists', 'query'),
+    (QuerySet, 'aggregate', 'query'),
+    (Serializer, 'to_representation', 'serialize'),
+    (ListSerializer, 'to_representation', 'serialize'),
+)
+
+# Order of the phases in the Server-Timing header.
+PHASES = ('auth', 'permission', 'filter', 'query', 'serialize', 'render')
+
+# Queries listed in a logged report.
+REPORTED_QUERIES = 10
+
+
+class Profile:
+    """Phase timings and executed queries of one request.
+
+    Phases are exclusive: time spent in a nested phase, e.g. a queryset
+    evaluated by a serializer, counts towards the nested phase only.
+    The ``db`` time overlaps the phases that run the queries.
+
+    Nothing is recorded until the profile is active. Queries are
+    recorded on the connections of the threads that ``watch`` them.
+    """
+
+    def __init__(self, active=False):
+        self.active = active
+        self.started = time.perf_counter()
+        self.phases = Counter()
+        self.queries = []
+        self._stack = []
+        self._mark = None
+        self._watched = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(
+                (sql, repr(params), time.perf_counter() - started))
+
+    def activate(self):
+        self.active = True
+        self.watch()
+
+    def watch(self):
+        """Record the queries run on this thread's connection."""
+        db = connections[DEFAULT_DB_ALIAS]
+        if self.active and self not in db.execute_wrappers:
+            db.execute_wrappers.append(self)
+            self._watched.append(db)
+
+    def unwatch(self, db=None):
+        for watched in [db] if db is not None else self._watched[:]:
+            if watched in self._watched:
+                watched.execute_wrappers.remove(self)
+                self._watched.remove(watched)
+
+    def enter(self, phase):
+        now = time.perf_counter()
+        if self._stack:
+            self.phases[self._stack[-1]] += now - self._mark
+        self._stack.append(phase)
+        self._mark = now
+
+    def leave(self):
+        now = time.perf_counter()
+        self.phases[self._stack.pop()] += now - self._mark
+        self._mark = now
+
+    @property
+    def sql_time(self):
+        return sum(duration for *_, duration in self.queries)
+
+    @property
+    def duplicates(self):
+        """Queries that repeat an earlier query with the same params."""
+        counts = Counter((sql, params) for sql, params, _ in self.queries)
+        return sum(count - 1 for count in counts.values())
+
+    def repeated(self):
+        """``(sql, count)`` of statements run more than once, e.g. N+1."""
+        counts = Counter(sql for sql, *_ in self.queries)
+        return [(sql, count) for sql, count in counts.most_common()
+                if count > 1]
+
+    def server_timing(self, total):
+        metrics = [f'total;dur={1000 * total:.1f}']
+        metrics.extend(
+            f'{phase};dur={1000 * self.phases[phase]:.1f}'
+            for phase in PHASES if phase in self.phases)
+        metrics.append(
+            f'db;dur={1000 * self.sql_time:.1f};desc="{len(self.queries)} '
+            f'queries, {self.duplicates} duplicates"')
+        return ', '.join(metrics)
+
+    def report(self, request, response, total):
+        slowest = sorted(self.queries, key=lambda query: query[2],
+                         reverse=True)[:REPORTED_QUERIES]
+        # SQL is logged with placeholders only; params may hold user data.
+        return {
+            'method': request.method,
+            'path': request.path,
+            'view': getattr(request.resolver_match, 'view_name', None),
+            'status': response.status_code,
+            'total_ms': round(1000 * total, 3),
+            'phases_ms': {phase: round(1000 * duration, 3)
+                          for phase, duration in self.phases.items()},
+            'queries': len(self.queries),
+            'sql_ms': round(1000 * self.sql_time, 3),
+            'duplicates': self.duplicates,
+            'repeated': [{'sql': sql, 'count': count}
+                         for sql, count in self.repeated()[:REPORTED_QUERIES]],
+            'slowest': [{'sql': sql, 'ms': round(1000 * duration, 3)}
+                        for sql, _, duration in slowest],
+        }
+
+
+def timed(phase, function):
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        profile = current.get()
+        if profile is None or not profile.active:
+            return function(*args, **kwargs)
+        profile.enter(phase)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profile.leave()
+
+    wrapper.profiled = True
+    return wrapper
+
+
+def profile_staff(function):
+    """Activate the profile once the request's user is known to be staff.
+
+    Queries run before that, e.g. the token lookup, are not recorded.
+    """
+    @wraps(function)
+    def wrapper(view, request):
+        profile = current.get()
+        if profile is None or profile.active:
+            return function(view, request)
+        started = time.perf_counter()
+        result = function(view, request)
+        if request.user.is_staff:
+            profile.activate()
+            profile.phases['auth'] += time.perf_counter() - started
+        return result
+
+    wrapper.profiled = wrapper.profiles_staff = True
+    return wrapper
+
+
+@contextmanager
+def watching():
+    """Record the current profile's queries in this worker thread.
+
+    Connections belong to threads, so views run by ``sync_to_async``
+    outside the request thread use this around the view.
+    """
+    profile = current.get()
+    if profile is None:
+        yield
+        return
+    profile.watch()
+    try:
+        yield
+    finally:
+        profile.unwatch(connections[DEFAULT_DB_ALIAS])
+
+
+def install():
+    """Wrap the DRF methods of every phase; safe to call repeatedly."""
+    for cls, name, phase in PHASE_HOOKS:
+        method = cls.__dict__[name]
+        if not getattr(method, 'profiled', False):
+            setattr(cls, name, timed(phase, method))
+    authenticate = APIView.__dict__['perform_authentication']
+    if not getattr(authenticate, 'profiles_staff', False):
+        APIView.perform_authentication = profile_staff(authenticate)
+    rendered_content = Response.__dict__['rendered_content']
+    if not getattr(rendered_content.fget, 'profiled', False):
+        Response.rendered_content = property(
+            timed('render', rendered_content.fget))
+
+
+class ProfilingMiddleware:
+    """Profile sampled requests and requests by staff users.
+
+    Enabled by ``PROFILING``. A ``PROFILING_SAMPLE_RATE`` share of the
+    requests is profiled from the start and logged in detail (slowest
+    and repeated queries) to the rotating ``PROFILING_LOG_FILE``. Staff
+    users get a Server-Timing header with the phases of their requests;
+    other clients never see timings. Other requests only pay for a
+    ``random()`` call and a few attribute lookups.
+
+    A streamed body is produced after the header is sent: its queries
+    are only in the logged report, written once the stream ends.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        Path(settings.PROFILING_LOG_FILE).parent.mkdir(
+            parents=True, exist_ok=True)
+        install()
+
+    def __call__(self, request):
+        sampled = random.random() < settings.PROFILING_SAMPLE_RATE
+        profile = Profile(active=sampled)
+        token = current.set(profile)
+        try:
+            profile.watch()
+            response = self.get_response(request)
+        finally:
+            profile.unwatch()
+            current.reset(token)
+        if not profile.active:
+            return response
+        total = time.perf_counter() - profile.started
+        # DRF sets the authenticated user on the Django request as well.
+        if getattr(getattr(request, 'user', None), 'is_staff', False):
+            response['Server-Timing'] = profile.server_timing(total)
+        if sampled:
+            if response.streaming:
+                response.streaming_content = self.stream(
+                    request, response, profile, response.streaming_content)
+            else:
+                self.log(request, response, profile, total)
+        return response
+
+    def stream(self, request, response, profile, content):
+        profile.watch()
+        try:
+            yield from content
+        finally:
+            profile.unwatch()
+            self.log(request, response, profile,
+                     time.perf_counter() - profile.started)
+
+    def log(self, request, response, profile, total):
+        logger.info(json.dumps(profile.report(request, response, total),
+                               ensure_ascii=False))
@@ -20,6 +20,7 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'djoser',
     'users.apps.UsersConfig',
+    'api.apps.ApiConfig',
 ]
 
 MIDDLEWARE = [
@@ -34,6 +35,9 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'foodgram_backend.urls'
 
+# Set by asgi.py: hot read endpoints are served by async views.
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', 'False').lower() == 'true'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -59,10 +63,19 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        # Reuse connections across requests instead of opening one each.
+        'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', 60)),
     }
 }
 
+CONN_HEALTH_CHECKS = os.getenv('CONN_HEALTH_CHECKS', 'True').lower() == 'true'
+
+# PgBouncer in transaction pooling mode cannot keep server-side cursors
+# (used by QuerySet.iterator()) open across transactions.
+if os.getenv('DB_POOLER', '').lower() == 'pgbouncer':
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+
 """ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
@@ -70,6 +83,27 @@ DATABASES = {
     }
 } """
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# The local-memory cache is per process; set REDIS_URL to share cached
+# responses and their invalidation between gunicorn workers.
+if os.getenv('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL'),
+    }
+
+API_CACHE_TIMEOUT = int(os.getenv('API_CACHE_TIMEOUT', 300))
+
+PAGINATION_COUNT_CACHE_TIMEOUT = int(
+    os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', 30))
+
+PAGINATION_COUNT_ESTIMATE_THRESHOLD = 100000
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -103,6 +137,22 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+DEFAULT_FILE_STORAGE = 'users.storage.ContentAddressedStorage'
+
+IMAGE_MAX_UPLOAD_SIZE = int(
+    os.getenv('IMAGE_MAX_UPLOAD_SIZE', 5 * 1024 * 1024))
+
+# Images arrive base64-encoded inside JSON, a third larger than the file.
+DATA_UPLOAD_MAX_MEMORY_SIZE = IMAGE_MAX_UPLOAD_SIZE * 4 // 3 + 64 * 1024
+
+IMAGE_MAX_PIXELS = 40000000
+
+IMAGE_THUMBNAIL_WIDTHS = (160, 320, 640)
+
+IMAGE_THUMBNAIL_QUALITY = 80
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.User'
@@ -112,12 +162,83 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
 }
 
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 50))
+
+INGREDIENT_SEARCH_MIN_SUBSTRING_LENGTH = 3
+
+INGREDIENT_SEARCH_CACHED_PREFIX_LENGTH = 2
+
+INGREDIENT_SEARCH_CACHE_SIZE = 2048
+
+INGREDIENT_SEARCH_CACHE_TIMEOUT = 300
+
+RECIPE_SEARCH_CONFIG = os.getenv('RECIPE_SEARCH_CONFIG', 'russian')
+
+# Neighbours stored per recipe and returned by /recipes/{id}/similar/.
+SIMILAR_RECIPES_COUNT = 20
+
+SIMILAR_RECIPES_LIMIT = 6
+
+# Ids accepted by the bulk favorite, cart and subscribe endpoints.
+BULK_MAX_IDS = 100
+
+# Authors with more followers are pulled into feeds on read.
+FEED_FAN_OUT_LIMIT = int(os.getenv('FEED_FAN_OUT_LIMIT', 10000))
+
+# Users of recently seen tokens kept per process. Another worker may
+# accept a revoked token for up to AUTH_TOKEN_CACHE_TIMEOUT seconds.
+AUTH_TOKEN_CACHE_SIZE = 10000
+
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', 10))
+
+# Seconds to keep them in the shared cache as well; 0 disables it.
+AUTH_TOKEN_SHARED_CACHE_TIMEOUT = int(os.getenv(
+    'AUTH_TOKEN_SHARED_CACHE_TIMEOUT',
+    300 if os.getenv('REDIS_URL') else 0))
+
+# Opt-in request profiling: detailed reports for a sample of requests in
+# a rotating log, and a Server-Timing header for staff users.
+PROFILING = os.getenv('PROFILING', 'False').lower() == 'true'
+
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0.01))
+
+PROFILING_LOG_FILE = os.getenv('PROFILING_LOG_FILE',
+                               str(BASE_DIR / 'logs' / 'profiling.log'))
+
+if PROFILING:
+    MIDDLEWARE.insert(0, 'foodgram_backend.profiling.ProfilingMiddleware')
+    LOGGING = {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'handlers': {
+            'profiling': {
+                'class': 'logging.handlers.RotatingFileHandler',
+                'filename': PROFILING_LOG_FILE,
+                'maxBytes': 10 * 1024 * 1024,
+                'backupCount': 5,
+                'delay': True,
+            },
+        },
+        'loggers': {
+            'foodgram.profiling': {
+                'handlers': ['profiling'],
+                'level': 'INFO',
+                'propagate': False,
+            },
+        },
+    }
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'SERIALIZERS': {
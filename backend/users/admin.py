@@ -1,5 +1,10 @@
+from collections import defaultdict
+
+from django import forms
 from django.contrib import admin
 
+from users import bulk, search, shopping_list
+
 from .models import (
     Tag,
     Recipe,
@@ -32,7 +37,8 @@ class TagRecipeInline(admin.TabularInline):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'id', 'author', 'cooking_time')
+    list_display = ('name', 'id', 'author', 'cooking_time',
+                    'favorites_count')
     list_display_links = ('name', 'id', 'author')
     search_fields = ('name', 'author__username')
     list_filter = ('tags',)
@@ -44,8 +50,63 @@ class RecipeAdmin(admin.ModelAdmin):
             'tags',
             'ingredients_in_recipe__ingredient')
 
+    def save_related(self, request, form, formsets, change):
+        # A new recipe is in no cart yet.
+        old_amounts = (shopping_list.recipe_amounts(form.instance)
+                       if change else {})
+        super().save_related(request, form, formsets, change)
+        # The name, text and ingredient inlines are all saved by now.
+        if change:
+            shopping_list.recipe_changed(form.instance, old_amounts)
+        search.update_search_vectors([form.instance.pk])
+
+
+class LinkForm(forms.ModelForm):
+
+    def clean(self):
+        data = super().clean()
+        if (self._meta.model is Subscription
+                and data.get('user') is not None
+                and data.get('user') == data.get('author')):
+            raise forms.ValidationError('Нельзя подписаться на самого себя.')
+        return data
+
+
+@admin.register(Subscription, ShoppingCart)
+class LinkAdmin(admin.ModelAdmin):
+    """Adds and deletes through users.bulk, like the API.
+
+    Link rows are written without signals; add() and remove() keep
+    counters, shopping lists and feeds in step. A saved link is only
+    deleted, never edited.
+    """
+    form = LinkForm
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is None:
+            return ()
+        return ('user', bulk.LINKS[self.model])
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            return
+        model = type(obj)
+        field = model._meta.get_field(bulk.LINKS[model])
+        pk = getattr(obj, field.attname)
+        bulk.add(model, obj.user, [pk])
+        obj.pk = model.objects.get(user=obj.user, **{field.attname: pk}).pk
+
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, type(obj).objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        field = queryset.model._meta.get_field(bulk.LINKS[queryset.model])
+        linked = defaultdict(list)
+        for user_id, pk in queryset.values_list('user_id', field.attname):
+            linked[user_id].append(pk)
+        for user_id, pks in linked.items():
+            bulk.remove(queryset.model, User(pk=user_id), pks)
+
 
-admin.site.register(Subscription)
-admin.site.register(ShoppingCart)
 admin.site.register(Ingredient)
 admin.site.register(User)
@@ -4,3 +4,19 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from users import (
+            counters,
+            feed,
+            images,
+            search,
+            shopping_list,
+            storage
+        )
+        counters.connect()
+        feed.connect()
+        images.connect()
+        search.connect()
+        shopping_list.connect()
+        storage.connect()
@@ -0,0 +1,140 @@
+import csv
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+
+from users.models import Ingredient, Tag
+
+DEFAULT_INGREDIENTS_CSV = settings.BASE_DIR.parent / 'data' / 'ingredients.csv'
+CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(path):
+    """Yield ``(name, measurement_unit)`` rows from a two-column CSV file."""
+    with open(path, encoding='utf-8', newline='') as csv_file:
+        for row in csv.reader(csv_file):
+            if len(row) == 2:
+                yield row[0].strip(), row[1].strip()
+
+
+def iter_json_array(json_file):
+    """Yield the objects of a JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    buffer = json_file.read(CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError('Expected a JSON array.')
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = json_file.read(CHUNK_SIZE)
+            if not chunk:
+                raise
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+def read_json(path, fields=('name', 'measurement_unit')):
+    with open(path, encoding='utf-8') as json_file:
+        for item in iter_json_array(json_file):
+            yield tuple(str(item[field]).strip() for field in fields)
+
+
+def read_rows(path, fields=('name', 'measurement_unit')):
+    if str(path).endswith('.json'):
+        return read_json(path, fields)
+    return read_csv(path)
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+class CSVStream:
+    """Read-only file object that renders rows as CSV, for COPY."""
+
+    def __init__(self, rows):
+        self._lines = (self._format(row) for row in rows)
+        self._buffer = ''
+
+    @staticmethod
+    def _format(row):
+        return ','.join(
+            '"' + value.replace('"', '""') + '"' for value in row) + '\n'
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def copy_ingredients(rows):
+    """Load rows through a temporary table with PostgreSQL COPY.
+
+    The table is dropped right away, so several files can be loaded in
+    one transaction.
+    """
+    table = Ingredient._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMPORARY TABLE ingredient_import '
+            '(name varchar(128), measurement_unit varchar(64)) '
+            'ON COMMIT DROP'
+        )
+        cursor.copy_expert(
+            'COPY ingredient_import (name, measurement_unit) '
+            'FROM STDIN WITH (FORMAT csv)',
+            CSVStream(rows)
+        )
+        cursor.execute(
+            f'INSERT INTO {table} (name, measurement_unit) '
+            f'SELECT DISTINCT name, measurement_unit FROM ingredient_import '
+            f'ON CONFLICT (name, measurement_unit) DO NOTHING'
+        )
+        cursor.execute('DROP TABLE ingredient_import')
+
+
+def bulk_create_ingredients(rows, batch_size):
+    for batch in batched(rows, batch_size):
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=name, measurement_unit=unit)
+             for name, unit in batch],
+            ignore_conflicts=True
+        )
+
+
+def load_ingredients(rows, batch_size=5000, use_copy=None):
+    """Insert missing ingredients; must run inside a transaction."""
+    if use_copy is None:
+        use_copy = connection.vendor == 'postgresql'
+    if use_copy:
+        copy_ingredients(rows)
+    else:
+        bulk_create_ingredients(rows, batch_size)
+
+
+def load_tags(rows, batch_size=5000):
+    for batch in batched(rows, batch_size):
+        Tag.objects.bulk_create(
+            [Tag(name=name, slug=slug) for name, slug in batch],
+            ignore_conflicts=True
+        )
@@ -0,0 +1,103 @@
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save, pre_delete
+
+from users.models import Favorite, Recipe, ShoppingCart, Subscription, User
+
+# Source model: [(counter model, counter field, foreign key to it)].
+COUNTERS = {
+    Favorite: [(Recipe, 'favorites_count', 'recipe')],
+    ShoppingCart: [(Recipe, 'cart_count', 'recipe')],
+    Recipe: [(User, 'recipes_count', 'author')],
+    Subscription: [(User, 'subscribers_count', 'author')],
+}
+
+# Rows linking a user to a counted object. They have no delete
+# receivers, so the cascade from a deleted user or recipe stays one
+# DELETE per table; users.bulk.remove deletes them directly.
+LINKS = (Favorite, ShoppingCart, Subscription)
+
+
+def update_counters(sender, instance, delta):
+    for model, field, foreign_key in COUNTERS[sender]:
+        model.objects.filter(
+            pk=getattr(instance, f'{foreign_key}_id')
+        ).update(**{field: F(field) + delta})
+
+
+def update_many(sender, pks, delta):
+    """Bulk variant of ``update_counters`` for rows created or deleted
+    without signals; ``pks`` are the counted objects' keys."""
+    for model, field, _ in COUNTERS[sender]:
+        model.objects.filter(pk__in=pks).update(**{field: F(field) + delta})
+
+
+def increment_counters(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        update_counters(sender, instance, 1)
+
+
+def decrement_counters(sender, instance, **kwargs):
+    update_counters(sender, instance, -1)
+
+
+def remember_linked(sender, instance, **kwargs):
+    """Before a user is deleted, note the objects whose counters lose
+    the user's cascaded links."""
+    instance._linked_counters = [
+        (source, model, field, foreign_key,
+         list(source.objects.filter(user=instance).values_list(
+             foreign_key, flat=True)))
+        for source in LINKS
+        for model, field, foreign_key in COUNTERS[source]
+    ]
+
+
+def recount_linked(sender, instance, **kwargs):
+    for source, model, field, foreign_key, pks in getattr(
+            instance, '_linked_counters', ()):
+        if pks:
+            recount(source, model, field, foreign_key, pks)
+
+
+def connect():
+    for sender in COUNTERS:
+        post_save.connect(increment_counters, sender=sender,
+                          dispatch_uid=f'counters_{sender.__name__}_save')
+    # Recipes are loaded by the delete anyway, for their own cascades.
+    post_delete.connect(decrement_counters, sender=Recipe,
+                        dispatch_uid='counters_Recipe_delete')
+    pre_delete.connect(remember_linked, sender=User,
+                       dispatch_uid='counters_User_pre_delete')
+    post_delete.connect(recount_linked, sender=User,
+                        dispatch_uid='counters_User_delete')
+
+
+def actual_count(source, foreign_key):
+    return Coalesce(Subquery(
+        source.objects.filter(**{foreign_key: OuterRef('pk')})
+        .order_by().values(foreign_key)
+        .annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def recount(source, model, field, foreign_key, pks):
+    """Set ``field`` of the ``pks`` rows of ``model`` from the database."""
+    return model.objects.filter(pk__in=pks).update(
+        **{field: actual_count(source, foreign_key)})
+
+
+def reconcile():
+    """Recount every counter and fix rows that drifted.
+
+    Returns ``{'Model.field': number of corrected rows}``.
+    """
+    fixed = {}
+    for source, counters in COUNTERS.items():
+        for model, field, foreign_key in counters:
+            drifted = model.objects.annotate(
+                actual=actual_count(source, foreign_key)
+            ).filter(~Q(**{field: F('actual')}))
+            fixed[f'{model.__name__}.{field}'] = recount(
+                source, model, field, foreign_key, drifted.values('pk'))
+    return fixed
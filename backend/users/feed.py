@@ -0,0 +1,125 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.signals import post_save
+
+from users.models import FeedItem, Recipe, Subscription, User
+
+# Recipes copied into the feed of a new follower.
+BACKFILL_SIZE = 20
+
+
+def fans_out(author):
+    """Whether ``author``'s recipes are pushed to followers on write.
+
+    Authors with more followers than ``FEED_FAN_OUT_LIMIT`` are left
+    out of inboxes; their recipes are pulled when a feed is read.
+    """
+    return author.subscribers_count <= settings.FEED_FAN_OUT_LIMIT
+
+
+def push(recipes):
+    """Insert ``recipes`` into the inboxes of their authors' followers
+    with one INSERT ... SELECT; return the inserted rows."""
+    recipes_sql, params = recipes.values('id').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {FeedItem._meta.db_table} '
+            '(user_id, recipe_id, author_id, pub_date) '
+            'SELECT subscription.user_id, recipe.id, recipe.author_id, '
+            'recipe.pub_date '
+            f'FROM {Recipe._meta.db_table} recipe '
+            f'JOIN {Subscription._meta.db_table} subscription '
+            'ON subscription.author_id = recipe.author_id '
+            f'WHERE recipe.id IN ({recipes_sql}) '
+            'ON CONFLICT DO NOTHING',
+            params)
+        return cursor.rowcount
+
+
+def publish(recipe):
+    """Copy a new recipe into the inboxes of its author's followers.
+
+    The recipe is saved with ``fanned_out=fans_out(author)``; recipes
+    that are pulled on read are skipped.
+    """
+    if not recipe.fanned_out:
+        return 0
+    return push(Recipe.objects.filter(pk=recipe.pk))
+
+
+@transaction.atomic
+def fan_out_pending():
+    """Copy recipes that are not in feeds yet into them.
+
+    Used for recipes created before the feed existed or while their
+    author was over the fan-out limit. Returns the inserted rows.
+    """
+    recipes = Recipe.objects.filter(
+        fanned_out=False,
+        author__in=User.objects.filter(
+            subscribers_count__lte=settings.FEED_FAN_OUT_LIMIT)
+    )
+    published = push(recipes)
+    recipes.update(fanned_out=True)
+    return published
+
+
+def before(position, date_field, id_field):
+    """Keyset filter for rows older than ``(pub_date, id)``."""
+    pub_date, pk = position
+    # The redundant bound lets the index scan start at the position.
+    return Q(**{f'{date_field}__lte': pub_date}) & (
+        Q(**{f'{date_field}__lt': pub_date})
+        | Q(**{date_field: pub_date, f'{id_field}__lt': pk}))
+
+
+def read(user, position, limit):
+    """Return up to ``limit`` ``(pub_date, recipe id)`` keys of
+    ``user``'s feed older than ``position``, newest first.
+
+    Pushed recipes come from one range scan over the inbox; recipes of
+    authors over the fan-out limit from the partial index of recipes
+    that were not pushed.
+    """
+    pushed = FeedItem.objects.filter(user=user)
+    pulled = Recipe.objects.filter(
+        fanned_out=False,
+        author__in=Subscription.objects.filter(user=user).values('author')
+    )
+    if position is not None:
+        pushed = pushed.filter(before(position, 'pub_date', 'recipe_id'))
+        pulled = pulled.filter(before(position, 'pub_date', 'id'))
+    keys = set(pushed.order_by('-pub_date', '-recipe_id').values_list(
+        'pub_date', 'recipe_id')[:limit])
+    keys.update(pulled.order_by('-pub_date', '-id').values_list(
+        'pub_date', 'id')[:limit])
+    return sorted(keys, reverse=True)[:limit]
+
+
+def backfill(user_id, author_ids):
+    """Copy the latest pushed recipes of new authors into a feed."""
+    recent = Recipe.objects.filter(fanned_out=True).latest_by_author(
+        author_ids, BACKFILL_SIZE).values_list('id', 'author_id', 'pub_date')
+    FeedItem.objects.bulk_create(
+        (FeedItem(user_id=user_id, recipe_id=recipe_id, author_id=author_id,
+                  pub_date=pub_date)
+         for recipe_id, author_id, pub_date in recent),
+        ignore_conflicts=True)
+
+
+def forget(user_id, author_ids):
+    FeedItem.objects.filter(user_id=user_id,
+                            author_id__in=author_ids).delete()
+
+
+def follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        backfill(instance.user_id, [instance.author_id])
+
+
+def connect():
+    # Unsubscribing goes through users.bulk.remove, which calls forget();
+    # a delete receiver would turn off the fast cascade delete.
+    post_save.connect(follow, sender=Subscription,
+                      dispatch_uid='feed_subscription_save')
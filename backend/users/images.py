@@ -0,0 +1,211 @@
+import base64
+import binascii
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models.signals import post_save, pre_save
+from PIL import Image, ImageOps
+
+from users.models import Recipe, User
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+DECODE_CHUNK_SIZE = 64 * 1024
+SPOOL_SIZE = 1024 * 1024
+THUMBNAIL_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+# Model: (image field, srcset field).
+IMAGE_FIELDS = {
+    Recipe: ('image', 'image_srcset'),
+    User: ('avatar', 'avatar_srcset'),
+}
+
+# Pillow releases the GIL while decoding, resizing and encoding, so a
+# thread pool keeps thumbnails off the request without forking Django.
+executor = ThreadPoolExecutor(max_workers=settings.IMAGE_WORKERS,
+                              thread_name_prefix='thumbnails')
+
+
+class ImageError(ValueError):
+    pass
+
+
+def decode_base64_image(data, max_size):
+    """Decode a ``data:image/...;base64,`` string into a temporary file.
+
+    The payload is decoded in chunks and rejected as soon as it exceeds
+    ``max_size`` bytes, so oversized uploads never become one big bytes
+    object.
+    """
+    header, _, encoded = data.partition(';base64,')
+    # Line breaks and spaces were accepted by the old b64decode() call.
+    encoded = ''.join(encoded.split())
+    if not encoded:
+        raise ImageError('Некорректное изображение.')
+    if len(encoded) // 4 * 3 > max_size + 2:
+        raise ImageError('Изображение слишком большое.')
+    output = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    size = 0
+    try:
+        for start in range(0, len(encoded), DECODE_CHUNK_SIZE):
+            chunk = base64.b64decode(
+                encoded[start:start + DECODE_CHUNK_SIZE], validate=True)
+            size += len(chunk)
+            if size > max_size:
+                raise ImageError('Изображение слишком большое.')
+            output.write(chunk)
+    except binascii.Error:
+        output.close()
+        raise ImageError('Некорректное изображение.')
+    except ImageError:
+        output.close()
+        raise
+    output.seek(0)
+    image_file = File(output, name='image.' + header.split('/')[-1])
+    image_file.size = size
+    return image_file
+
+
+def check_image(image_file):
+    """Validate format and dimensions from the image header only."""
+    try:
+        with Image.open(image_file) as image:
+            image_format = image.format
+            width, height = image.size
+    except (OSError, Image.DecompressionBombError):
+        raise ImageError('Некорректное изображение.')
+    finally:
+        image_file.seek(0)
+    if image_format not in ALLOWED_FORMATS:
+        raise ImageError('Неподдерживаемый формат изображения.')
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ImageError('Слишком большое разрешение изображения.')
+
+
+def thumbnail_name(name, width, extension):
+    stem = os.path.splitext(name)[0]
+    return f'thumbnails/{stem}/{width}.{extension}'
+
+
+def render_thumbnails(name):
+    """Encode every thumbnail of the stored image ``name``.
+
+    Returns ``{extension: {width: ContentFile}}``.
+    """
+    with default_storage.open(name) as source:
+        original = ImageOps.exif_transpose(Image.open(source))
+        original.load()
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA')
+    thumbnails = {extension: {} for extension in THUMBNAIL_FORMATS}
+    for width in settings.IMAGE_THUMBNAIL_WIDTHS:
+        if width > original.width and thumbnails['jpeg']:
+            break
+        image = original.copy()
+        image.thumbnail((width, original.height))
+        for extension, image_format in THUMBNAIL_FORMATS.items():
+            if image_format == 'JPEG' and image.mode != 'RGB':
+                encoded = image.convert('RGB')
+            else:
+                encoded = image
+            buffer = BytesIO()
+            encoded.save(buffer, image_format,
+                         quality=settings.IMAGE_THUMBNAIL_QUALITY)
+            thumbnails[extension][image.width] = ContentFile(
+                buffer.getvalue(),
+                name=thumbnail_name(name, image.width, extension))
+    return thumbnails
+
+
+def generate_thumbnails(model, pk, name):
+    image_field, srcset_field = IMAGE_FIELDS[model]
+    try:
+        thumbnails = render_thumbnails(name)
+        # Thumbnails are stored files like the image: saving the srcset
+        # counts their references (see users.storage).
+        with transaction.atomic():
+            srcset = {
+                extension: {width: default_storage.save(content.name, content)
+                            for width, content in files.items()}
+                for extension, files in thumbnails.items()
+            }
+            instance = model.objects.select_for_update().filter(
+                pk=pk, **{image_field: name}).first()
+            if instance is not None:
+                setattr(instance, srcset_field, {'source': name, **srcset})
+                instance.save(update_fields=[srcset_field])
+        if instance is None:
+            # The image was replaced meanwhile; drop the unused files.
+            for names in srcset.values():
+                for thumbnail in names.values():
+                    default_storage.delete(thumbnail)
+    except Exception:
+        logger.exception('Could not generate thumbnails for %s', name)
+
+
+def thumbnail_task(model, pk, name):
+    try:
+        generate_thumbnails(model, pk, name)
+    finally:
+        connections.close_all()
+
+
+def drop_stale_thumbnails(sender, instance, update_fields=None, raw=False,
+                          **kwargs):
+    # Thumbnails of a removed image are released on save. A new upload
+    # is named only when stored; its thumbnails replace these later.
+    image_field, srcset_field = IMAGE_FIELDS[sender]
+    if raw or update_fields is not None and srcset_field not in update_fields:
+        return
+    thumbnails = getattr(instance, srcset_field)
+    image = getattr(instance, image_field)
+    if (thumbnails and image._committed
+            and thumbnails.get('source') != image.name):
+        setattr(instance, srcset_field, {})
+
+
+def schedule_thumbnails(sender, instance, update_fields=None, raw=False,
+                        **kwargs):
+    image_field, srcset_field = IMAGE_FIELDS[sender]
+    # CounterFieldsMixin lists every field on a plain save(), so only
+    # saves that leave the image out, like the srcset save, are skipped.
+    if raw or update_fields is not None and image_field not in update_fields:
+        return
+    name = getattr(instance, image_field).name
+    if name and getattr(instance, srcset_field).get('source') != name:
+        transaction.on_commit(lambda: executor.submit(
+            thumbnail_task, sender, instance.pk, name))
+
+
+def srcset(instance):
+    """Return ``{format: srcset string}`` for the instance's image."""
+    image_field, srcset_field = IMAGE_FIELDS[type(instance)]
+    thumbnails = getattr(instance, srcset_field)
+    if thumbnails.get('source') != getattr(instance, image_field).name:
+        return {}
+    result = {}
+    for extension in THUMBNAIL_FORMATS:
+        candidates = []
+        for width, name in sorted(thumbnails.get(extension, {}).items(),
+                                  key=lambda item: int(item[0])):
+            candidates.append(f'{default_storage.url(name)} {width}w')
+        if candidates:
+            result[extension] = ', '.join(candidates)
+    return result
+
+
+def connect():
+    for sender in IMAGE_FIELDS:
+        pre_save.connect(drop_stale_thumbnails, sender=sender,
+                         dispatch_uid=f'stale_thumbnails_{sender.__name__}')
+        post_save.connect(schedule_thumbnails, sender=sender,
+                          dispatch_uid=f'thumbnails_{sender.__name__}')
@@ -0,0 +1,387 @@
+import base64
+import json
+import statistics
+import tempfile
+import time
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.serializers import BaseSerializer
+from rest_framework.test import APIClient
+
+from users import images, similarity
+from users.models import Recipe, User
+from users.catalog import DEFAULT_INGREDIENTS_CSV
+from users.seed import seed_dataset
+
+DEFAULT_BASELINE = settings.BASE_DIR / 'benchmarks' / 'baseline.json'
+DEFAULT_TOLERANCES = {'queries': 0, 'time': 0.5}
+PASSWORD = 'bench-password-123'
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark',
+    }
+}
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAQMAAAAl21bKAAAA'
+    'A1BMVEUAAACnej3aAAAAAXRSTlMAQObYZgAAAApJREFUCNdjYAAAAAIAAeIhvDMAAAAAS'
+    'UVORK5CYII='
+)
+
+
+class QueryTimer:
+    """Count queries and accumulate their wall time on ``connection``."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.total += time.perf_counter() - started
+
+
+class SerializationTimer:
+    """Measure time spent in the outermost ``serializer.data`` calls."""
+
+    def __init__(self):
+        self.total = 0.0
+        self._depth = 0
+
+    @contextmanager
+    def installed(self):
+        original = BaseSerializer.data
+        timer = self
+
+        def timed_data(serializer):
+            timer._depth += 1
+            started = time.perf_counter()
+            try:
+                return original.fget(serializer)
+            finally:
+                timer._depth -= 1
+                if not timer._depth:
+                    timer.total += time.perf_counter() - started
+
+        BaseSerializer.data = property(timed_data)
+        try:
+            yield self
+        finally:
+            BaseSerializer.data = original
+
+
+class DeferredExecutor(Executor):
+    """Runs background tasks between measured requests.
+
+    The in-memory test database locks whole tables, so thumbnails and
+    similar recipes must not be written by worker threads while a
+    request is measured.
+    """
+
+    def __init__(self):
+        self.pending = []
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        self.pending.append((future, fn, args, kwargs))
+        return future
+
+    def run_pending(self):
+        while self.pending:
+            future, fn, args, kwargs = self.pending.pop(0)
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception as error:
+                future.set_exception(error)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway test database and record query count, SQL '
+            'time, serialization time and latency for every API endpoint.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--recipes', type=int, default=200)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--favorites', type=int, default=10)
+        parser.add_argument('--cart', type=int, default=5)
+        parser.add_argument('--subscriptions', type=int, default=5)
+        parser.add_argument('--ingredients-csv',
+                            default=str(DEFAULT_INGREDIENTS_CSV))
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--endpoint', action='append', dest='endpoints',
+                            help='Only run endpoints with this name.')
+        parser.add_argument('--output', default='benchmark_results.json')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+        parser.add_argument('--update-baseline', action='store_true')
+        parser.add_argument('--compare-timings', action='store_true',
+                            help='Also fail on latency regressions; only '
+                                 'meaningful on the baseline hardware.')
+
+    def handle(self, *args, **options):
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        runner.setup_test_environment()
+        old_config = runner.setup_databases()
+        self.executor = DeferredExecutor()
+        try:
+            with tempfile.TemporaryDirectory() as media_root, \
+                    mock.patch.object(images, 'executor', self.executor), \
+                    mock.patch.object(similarity, 'executor',
+                                      self.executor), \
+                    override_settings(
+                        MEDIA_ROOT=media_root,
+                        CACHES=BENCHMARK_CACHES,
+                        PASSWORD_HASHERS=[
+                            'django.contrib.auth.hashers.MD5PasswordHasher']):
+                self.seed(options)
+                self.executor.run_pending()
+                results = self.run_endpoints(options)
+        finally:
+            runner.teardown_databases(old_config)
+            runner.teardown_test_environment()
+
+        report = {
+            'dataset': {key: options[key] for key in (
+                'users', 'recipes', 'ingredients_per_recipe', 'favorites',
+                'cart', 'subscriptions', 'iterations')},
+            'endpoints': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            json.dump(report, output, indent=2, ensure_ascii=False)
+        self.stdout.write(f'Results written to {options["output"]}')
+
+        if options['update_baseline']:
+            report['tolerances'] = DEFAULT_TOLERANCES
+            with open(options['baseline'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, indent=2, ensure_ascii=False)
+            self.stdout.write(f'Baseline updated: {options["baseline"]}')
+            return
+        self.compare(results, options)
+
+    def seed(self, options):
+        self.user = seed_dataset(
+            users=options['users'],
+            recipes=options['recipes'],
+            ingredients_per_recipe=options['ingredients_per_recipe'],
+            favorites=options['favorites'],
+            cart=options['cart'],
+            subscriptions=options['subscriptions'],
+            ingredients_csv=options['ingredients_csv'],
+        )
+        self.user.set_password(PASSWORD)
+        self.user.save()
+        self.author = User.objects.exclude(pk=self.user.pk).filter(
+            recipe_author__isnull=False).first()
+        self.target = User.objects.create(
+            username='bench_target', email='bench_target@example.com',
+            first_name='Bench', last_name='Target')
+        self.target_recipe = Recipe.objects.create(
+            author=self.target, name='Bench target', text='Target.',
+            image=ContentFile(base64.b64decode(IMAGE.split(',')[1]),
+                              name='bench.png'),
+            cooking_time=1)
+        self.recipe = Recipe.objects.filter(author=self.author).first()
+        self.ingredient_ids = list(Recipe.objects.filter(
+            pk=self.recipe.pk).values_list('ingredients__id', flat=True))
+        self.tag_ids = list(self.recipe.tags.values_list('id', flat=True))
+        self.bulk_recipe_ids = list(Recipe.objects.exclude(
+            shopping_carts__user=self.user).values_list('id', flat=True)[:50])
+
+    def endpoints(self):
+        recipe_payload = {
+            'name': 'Bench recipe',
+            'text': 'Created by the benchmark.',
+            'cooking_time': 10,
+            'image': IMAGE,
+            'tags': self.tag_ids,
+            'ingredients': [{'id': pk, 'amount': 10}
+                            for pk in self.ingredient_ids],
+        }
+        author = self.author.pk
+        recipe = self.recipe.pk
+        target = self.target.pk
+        target_recipe = self.target_recipe.pk
+        return [
+            ('users-list', 'get', '/api/users/', None),
+            ('users-create', 'post', '/api/users/', lambda i: {
+                'email': f'bench{i}@example.com', 'username': f'bench{i}',
+                'first_name': 'Bench', 'last_name': 'New',
+                'password': PASSWORD}),
+            ('users-detail', 'get', f'/api/users/{author}/', None),
+            ('users-me', 'get', '/api/users/me/', None),
+            ('users-avatar-put', 'put', '/api/users/me/avatar/',
+             {'avatar': IMAGE}),
+            ('users-avatar-delete', 'delete', '/api/users/me/avatar/', None),
+            ('users-set-password', 'post', '/api/users/set_password/',
+             {'current_password': PASSWORD, 'new_password': PASSWORD}),
+            ('users-subscriptions', 'get',
+             '/api/users/subscriptions/?recipes_limit=3', None),
+            ('users-subscriptions-cursor', 'get',
+             '/api/users/subscriptions/?recipes_limit=3&pagination=cursor',
+             None),
+            ('users-subscribe', 'post',
+             f'/api/users/{target}/subscribe/', None),
+            ('users-unsubscribe', 'delete',
+             f'/api/users/{target}/subscribe/', None),
+            ('tags-list', 'get', '/api/tags/', None),
+            ('tags-detail', 'get', f'/api/tags/{self.tag_ids[0]}/', None),
+            ('ingredients-list', 'get', '/api/ingredients/', None),
+            ('ingredients-search', 'get', '/api/ingredients/?name=аб', None),
+            ('ingredients-detail', 'get',
+             f'/api/ingredients/{self.ingredient_ids[0]}/', None),
+            ('recipes-list', 'get', '/api/recipes/', None),
+            ('recipes-list-cursor', 'get',
+             '/api/recipes/?pagination=cursor', None),
+            ('recipes-list-tags', 'get',
+             '/api/recipes/?tags=breakfast&tags=lunch', None),
+            ('recipes-list-author', 'get',
+             f'/api/recipes/?author={author}', None),
+            ('recipes-list-favorited', 'get',
+             '/api/recipes/?is_favorited=1', None),
+            ('recipes-list-in-cart', 'get',
+             '/api/recipes/?is_in_shopping_cart=1', None),
+            ('recipes-detail', 'get', f'/api/recipes/{recipe}/', None),
+            ('recipes-feed', 'get', '/api/recipes/feed/', None),
+            ('recipes-similar', 'get',
+             f'/api/recipes/{recipe}/similar/', None),
+            ('recipes-get-link', 'get',
+             f'/api/recipes/{recipe}/get-link/', None),
+            ('recipes-create', 'post', '/api/recipes/', recipe_payload),
+            ('recipes-update', 'patch', '/api/recipes/{created}/',
+             recipe_payload),
+            ('recipes-delete', 'delete', '/api/recipes/{created}/', None),
+            ('recipes-favorite', 'post',
+             f'/api/recipes/{target_recipe}/favorite/', None),
+            ('recipes-unfavorite', 'delete',
+             f'/api/recipes/{target_recipe}/favorite/', None),
+            ('recipes-cart-add', 'post',
+             f'/api/recipes/{target_recipe}/shopping_cart/', None),
+            ('recipes-cart-remove', 'delete',
+             f'/api/recipes/{target_recipe}/shopping_cart/', None),
+            ('recipes-cart-bulk-add', 'post', '/api/recipes/shopping_cart/',
+             {'ids': self.bulk_recipe_ids}),
+            ('recipes-cart-bulk-remove', 'delete',
+             '/api/recipes/shopping_cart/', {'ids': self.bulk_recipe_ids}),
+            ('recipes-download-cart', 'get',
+             '/api/recipes/download_shopping_cart/', None),
+            ('auth-login', 'post', '/api/auth/token/login/',
+             {'email': self.target.email, 'password': PASSWORD}),
+            ('auth-logout', 'post', '/api/auth/token/logout/', None),
+        ]
+
+    def run_endpoints(self, options):
+        self.target.set_password(PASSWORD)
+        self.target.save()
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user)}')
+        endpoints = [
+            endpoint for endpoint in self.endpoints()
+            if not options['endpoints'] or endpoint[0] in options['endpoints']
+        ]
+        samples = {name: [] for name, *_ in endpoints}
+        created = None
+        for iteration in range(options['iterations']):
+            for name, method, path, payload in endpoints:
+                if callable(payload):
+                    payload = payload(iteration)
+                if name == 'auth-logout':
+                    target_client = APIClient()
+                    target_client.credentials(HTTP_AUTHORIZATION=(
+                        f'Token {Token.objects.get(user=self.target)}'))
+                else:
+                    target_client = client
+                queries = QueryTimer()
+                timer = SerializationTimer()
+                with connection.execute_wrapper(queries), timer.installed():
+                    started = time.perf_counter()
+                    response = getattr(target_client, method)(
+                        path.format(created=created), payload,
+                        format='json')
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                    elapsed = time.perf_counter() - started
+                self.executor.run_pending()
+                if name == 'recipes-create':
+                    created = response.data.get('id')
+                samples[name].append({
+                    'status': response.status_code,
+                    'queries': queries.count,
+                    'sql_time': queries.total,
+                    'serialization_time': timer.total,
+                    'latency': elapsed,
+                })
+
+        results = {}
+        for name, runs in samples.items():
+            latencies = [run['latency'] for run in runs]
+            results[name] = {
+                'status': sorted({run['status'] for run in runs}),
+                'queries': max(run['queries'] for run in runs),
+                'sql_time_ms': round(1000 * statistics.mean(
+                    run['sql_time'] for run in runs), 3),
+                'serialization_time_ms': round(1000 * statistics.mean(
+                    run['serialization_time'] for run in runs), 3),
+                'p50_ms': round(1000 * percentile(latencies, 0.5), 3),
+                'p95_ms': round(1000 * percentile(latencies, 0.95), 3),
+            }
+            self.stdout.write(
+                f'{name:28} {results[name]["queries"]:4} queries '
+                f'p50 {results[name]["p50_ms"]:8.2f} ms '
+                f'p95 {results[name]["p95_ms"]:8.2f} ms')
+        return results
+
+    def compare(self, results, options):
+        try:
+            with open(options['baseline'], encoding='utf-8') as baseline_file:
+                baseline = json.load(baseline_file)
+        except FileNotFoundError:
+            self.stdout.write('No baseline found, skipping comparison.')
+            return
+        tolerances = {**DEFAULT_TOLERANCES, **baseline.get('tolerances', {})}
+        regressions = []
+        for name, result in results.items():
+            expected = baseline['endpoints'].get(name)
+            if expected is None:
+                self.stdout.write(f'{name}: not in baseline.')
+                continue
+            if result['status'] != expected['status']:
+                regressions.append(
+                    f'{name}: status {result["status"]}, '
+                    f'expected {expected["status"]}')
+            if result['queries'] > expected['queries'] + tolerances['queries']:
+                regressions.append(
+                    f'{name}: {result["queries"]} queries, '
+                    f'baseline {expected["queries"]}')
+            if not options['compare_timings']:
+                continue
+            for metric in ('p50_ms', 'p95_ms', 'sql_time_ms'):
+                limit = expected[metric] * (1 + tolerances['time'])
+                if result[metric] > limit:
+                    regressions.append(
+                        f'{name}: {metric} {result[metric]}, '
+                        f'baseline {expected[metric]}')
+        if regressions:
+            raise CommandError(
+                'Performance regressions:\n' + '\n'.join(regressions))
+        self.stdout.write(
+            self.style.SUCCESS('No regressions against baseline.'))
@@ -0,0 +1,89 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from api.ingredient_search import (
+    find_ingredients,
+    prefix_cache,
+    search_ingredients
+)
+from users.catalog import DEFAULT_INGREDIENTS_CSV, read_csv
+from users.management.commands.benchmark_api import (
+    BENCHMARK_CACHES,
+    percentile
+)
+from users.models import Ingredient
+from users.serializers import IngredientSerializer
+
+TERMS = ('а', 'мо', 'сыр', 'картоф', 'соус', 'ванил', 'шт')
+
+
+class Command(BaseCommand):
+    help = ('Load the ingredient catalog scaled N times into a throwaway '
+            'test database and compare the legacy istartswith filter with '
+            'the ranked ingredient search.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=100)
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--ingredients-csv',
+                            default=str(DEFAULT_INGREDIENTS_CSV))
+        parser.add_argument('--term', action='append', dest='terms')
+
+    def handle(self, *args, **options):
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        runner.setup_test_environment()
+        old_config = runner.setup_databases()
+        try:
+            with override_settings(CACHES=BENCHMARK_CACHES):
+                self.load(options['ingredients_csv'], options['scale'])
+                self.run(options['terms'] or TERMS, options['iterations'])
+        finally:
+            runner.teardown_databases(old_config)
+            runner.teardown_test_environment()
+
+    def load(self, path, scale):
+        catalog = list(read_csv(path))
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=f'{name} {copy}' if copy else name,
+                        measurement_unit=unit)
+             for copy in range(scale) for name, unit in catalog),
+            batch_size=10000
+        )
+        self.stdout.write(
+            f'Loaded {Ingredient.objects.count()} ingredients.')
+
+    def measure(self, function, iterations):
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            result = function()
+            timings.append(time.perf_counter() - started)
+        return len(result), timings
+
+    def run(self, terms, iterations):
+        def legacy(term):
+            return IngredientSerializer(
+                Ingredient.objects.filter(name__istartswith=term),
+                many=True).data
+
+        def uncached(term):
+            return IngredientSerializer(
+                find_ingredients(term.lower(), 50), many=True).data
+
+        def cached(term):
+            return search_ingredients(term)
+
+        for term in terms:
+            prefix_cache.clear()
+            for label, function in (('legacy', legacy),
+                                    ('search', uncached),
+                                    ('cached', cached)):
+                count, timings = self.measure(
+                    lambda: function(term), iterations)
+                self.stdout.write(
+                    f'{term:10} {label:7} {count:7} rows '
+                    f'p50 {1000 * percentile(timings, 0.5):9.2f} ms '
+                    f'p95 {1000 * percentile(timings, 0.95):9.2f} ms')
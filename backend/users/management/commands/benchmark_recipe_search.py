@@ -0,0 +1,102 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from users.catalog import DEFAULT_INGREDIENTS_CSV, load_ingredients, read_csv
+from users.management.commands.benchmark_api import (
+    BENCHMARK_CACHES,
+    percentile
+)
+from users.models import Ingredient, Recipe, RecipeIngredient, User
+from users.search import search_recipes, update_search_vectors
+
+TERMS = ('борщ', 'сыр', 'курица с картофелем', 'шоколадный торт',
+         'соус -острый')
+DISHES = ('Борщ', 'Салат', 'Суп', 'Пирог', 'Торт', 'Омлет', 'Рагу',
+          'Запеканка', 'Паста', 'Плов', 'Каша', 'Соус')
+BATCH_SIZE = 10000
+
+
+class Command(BaseCommand):
+    help = ('Create N synthetic recipes in a throwaway PostgreSQL test '
+            'database and compare icontains filtering with the ranked '
+            'full-text search.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=6)
+        parser.add_argument('--iterations', type=int, default=10)
+        parser.add_argument('--ingredients-csv',
+                            default=str(DEFAULT_INGREDIENTS_CSV))
+        parser.add_argument('--term', action='append', dest='terms')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Full-text search needs PostgreSQL.')
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        runner.setup_test_environment()
+        old_config = runner.setup_databases()
+        try:
+            with override_settings(CACHES=BENCHMARK_CACHES):
+                self.load(options)
+                self.run(options['terms'] or TERMS, options['iterations'])
+        finally:
+            runner.teardown_databases(old_config)
+            runner.teardown_test_environment()
+
+    def load(self, options):
+        rnd = random.Random(options['seed'])
+        with transaction.atomic():
+            load_ingredients(read_csv(options['ingredients_csv']))
+        ingredients = list(Ingredient.objects.values_list('id', 'name'))
+        author = User.objects.create(username='search', email='s@e.com')
+        started = time.perf_counter()
+        for offset in range(0, options['recipes'], BATCH_SIZE):
+            size = min(BATCH_SIZE, options['recipes'] - offset)
+            picks = [rnd.sample(ingredients, options['ingredients_per_recipe'])
+                     for _ in range(size)]
+            recipes = Recipe.objects.bulk_create(
+                Recipe(author=author, cooking_time=rnd.randint(5, 120),
+                       name=f'{rnd.choice(DISHES)} {pick[0][1]}',
+                       text=' '.join(name for _, name in pick))
+                for pick in picks
+            )
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient_id=ingredient_id,
+                                 amount=rnd.randint(1, 500))
+                for recipe, pick in zip(recipes, picks)
+                for ingredient_id, _ in pick
+            )
+        update_search_vectors()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE users_recipe')
+        self.stdout.write(
+            f'Loaded {options["recipes"]} recipes in '
+            f'{time.perf_counter() - started:.1f} s.')
+
+    def measure(self, queryset, iterations):
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            ids = list(queryset.values_list('id', flat=True)[:6])
+            timings.append(time.perf_counter() - started)
+        return len(ids), timings
+
+    def run(self, terms, iterations):
+        recipes = Recipe.objects.all()
+        for term in terms:
+            for label, queryset in (
+                    ('icontains', recipes.filter(
+                        Q(name__icontains=term) | Q(text__icontains=term))),
+                    ('search', search_recipes(recipes, term))):
+                count, timings = self.measure(queryset, iterations)
+                self.stdout.write(
+                    f'{term:24} {label:9} {count:2} rows '
+                    f'p50 {1000 * percentile(timings, 0.5):9.2f} ms '
+                    f'p95 {1000 * percentile(timings, 0.95):9.2f} ms')
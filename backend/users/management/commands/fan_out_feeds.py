@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from users import feed
+
+
+class Command(BaseCommand):
+    help = ('Copy recipes that are not in subscription feeds yet (created '
+            'before the feed existed or while their author had too many '
+            'followers) into the feeds.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Added {feed.fan_out_pending()} feed items.')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from users import images
+
+
+class Command(BaseCommand):
+    help = ('Generate thumbnails for recipe images and avatars that do not '
+            'have them yet.')
+
+    def handle(self, *args, **options):
+        for model, (image_field, srcset_field) in images.IMAGE_FIELDS.items():
+            generated = 0
+            instances = model.objects.exclude(
+                **{image_field: ''}).only('pk', image_field, srcset_field)
+            for instance in instances.iterator():
+                name = getattr(instance, image_field).name
+                if getattr(instance, srcset_field).get('source') != name:
+                    images.generate_thumbnails(model, instance.pk, name)
+                    generated += 1
+            self.stdout.write(
+                f'{model.__name__}: generated thumbnails for {generated} '
+                f'images.')
@@ -0,0 +1,77 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.cache import bump_version
+from users.catalog import (
+    DEFAULT_INGREDIENTS_CSV,
+    load_ingredients,
+    load_tags,
+    read_rows
+)
+from users.models import Ingredient, Tag
+
+
+class CountingIterator:
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.count = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = next(self.rows)
+        self.count += 1
+        return row
+
+
+class Command(BaseCommand):
+    help = ('Load ingredients (name, measurement_unit) and tags '
+            '(name, slug) from CSV or JSON files. Existing rows are kept, '
+            'so the command can be run repeatedly.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*',
+                            default=[str(DEFAULT_INGREDIENTS_CSV)],
+                            help='Ingredient files, .csv or .json.')
+        parser.add_argument('--tags', action='append', default=[],
+                            help='Tag file, .csv or .json.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--no-copy', action='store_true',
+                            help='Use bulk_create even on PostgreSQL.')
+
+    def handle(self, *args, **options):
+        use_copy = (connection.vendor == 'postgresql'
+                    and not options['no_copy'])
+        started = time.perf_counter()
+        ingredients_before = Ingredient.objects.count()
+        tags_before = Tag.objects.count()
+        rows = 0
+        try:
+            with transaction.atomic():
+                for path in options['paths']:
+                    counter = CountingIterator(read_rows(path))
+                    load_ingredients(counter, options['batch_size'],
+                                     use_copy)
+                    rows += counter.count
+                for path in options['tags']:
+                    counter = CountingIterator(
+                        read_rows(path, fields=('name', 'slug')))
+                    load_tags(counter, options['batch_size'])
+                    rows += counter.count
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f'Could not load the catalog: {error}')
+        bump_version('ingredients')
+        bump_version('tags')
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Read {rows} rows in {elapsed:.2f} s '
+            f'({rows / elapsed if elapsed else rows:.0f} rows/s) using '
+            f'{"COPY" if use_copy else "bulk_create"}: '
+            f'{Ingredient.objects.count() - ingredients_before} new '
+            f'ingredients, {Tag.objects.count() - tags_before} new tags.'
+        ))
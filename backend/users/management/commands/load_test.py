@@ -0,0 +1,171 @@
+import asyncio
+import socket
+import subprocess
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from users.management.commands.benchmark_api import percentile
+
+SERVERS = {
+    'wsgi': ['gunicorn', 'foodgram_backend.wsgi'],
+    'asgi': ['gunicorn', '--worker-class', 'uvicorn.workers.UvicornWorker',
+             'foodgram_backend.asgi'],
+}
+STARTUP_TIMEOUT = 30
+
+
+async def read_response(reader):
+    """Read one HTTP/1.1 response; return ``(status, keep_alive)``."""
+    status_line = await reader.readuntil(b'\r\n')
+    version, status = status_line.split()[:2]
+    headers = {}
+    while True:
+        line = await reader.readuntil(b'\r\n')
+        if line == b'\r\n':
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip().lower()
+    if headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(int(headers.get('content-length', 0)))
+    keep_alive = (version == b'HTTP/1.1'
+                  and headers.get('connection') != 'close')
+    return int(status), keep_alive
+
+
+async def client(host, port, request, deadline, latencies, errors):
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(request)
+            await writer.drain()
+            status, keep_alive = await read_response(reader)
+        except (OSError, ValueError, asyncio.IncompleteReadError,
+                asyncio.LimitOverrunError):
+            errors.append(None)
+            keep_alive = False
+        else:
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors.append(status)
+        if not keep_alive and writer is not None:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(host, port, path, concurrency, duration, headers):
+    request = (
+        f'GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\n'
+        + ''.join(f'{name}: {value}\r\n' for name, value in headers)
+        + '\r\n'
+    ).encode()
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(
+        client(host, port, request, deadline, latencies, errors)
+        for _ in range(concurrency)))
+    return latencies, errors
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(host, port, process):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError('The server exited during startup.')
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError('The server did not start in time.')
+
+
+class Command(BaseCommand):
+    help = ('Measure requests/s and latency percentiles of read endpoints '
+            'with many concurrent connections, either against a running '
+            'server (--url) or against gunicorn servers started for the '
+            'run (--server wsgi/asgi).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', action='append', dest='urls',
+                            default=[],
+                            help='Base URL of a running server.')
+        parser.add_argument('--server', action='append', dest='servers',
+                            choices=SERVERS, default=[],
+                            help='Start this server for the run.')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Endpoint to load, /api/recipes/ by '
+                                 'default.')
+        parser.add_argument('--concurrency', type=int, default=500)
+        parser.add_argument('--duration', type=float, default=20)
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Workers of the started servers.')
+        parser.add_argument('--token',
+                            help='Send Authorization: Token <token>.')
+
+    def handle(self, *args, **options):
+        if not options['urls'] and not options['servers']:
+            raise CommandError('Pass --url or --server.')
+        self.options = options
+        headers = [('Accept', 'application/json')]
+        if options['token']:
+            headers.append(('Authorization', f'Token {options["token"]}'))
+        self.headers = headers
+        self.stdout.write(
+            f'{"target":12} {"path":32} {"requests":>9} {"req/s":>9} '
+            f'{"p50 ms":>9} {"p99 ms":>9} {"errors":>7}')
+        for url in options['urls']:
+            parts = urlsplit(url)
+            self.measure(url, parts.hostname, parts.port or 80)
+        for server in options['servers']:
+            self.measure_server(server)
+
+    def measure_server(self, server):
+        host, port = '127.0.0.1', free_port()
+        command = SERVERS[server] + [
+            '--bind', f'{host}:{port}',
+            '--workers', str(self.options['workers']),
+            '--backlog', str(max(2048, self.options['concurrency'])),
+        ]
+        process = subprocess.Popen(command, cwd=settings.BASE_DIR,
+                                   stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.DEVNULL)
+        try:
+            wait_until_ready(host, port, process)
+            self.measure(server, host, port)
+        finally:
+            process.terminate()
+            process.wait()
+
+    def measure(self, target, host, port):
+        for path in self.options['paths'] or ['/api/recipes/']:
+            latencies, errors = asyncio.run(run_load(
+                host, port, path, self.options['concurrency'],
+                self.options['duration'], self.headers))
+            if not latencies:
+                raise CommandError(f'{target}: no successful requests.')
+            self.stdout.write(
+                f'{target:12} {path:32} {len(latencies):9} '
+                f'{len(latencies) / self.options["duration"]:9.1f} '
+                f'{1000 * percentile(latencies, 0.5):9.1f} '
+                f'{1000 * percentile(latencies, 0.99):9.1f} '
+                f'{len(errors):7}')
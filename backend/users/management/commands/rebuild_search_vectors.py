@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from users.search import update_search_vectors
+
+
+class Command(BaseCommand):
+    help = ('Recompute the full-text search documents of all recipes '
+            '(PostgreSQL only).')
+
+    def handle(self, *args, **options):
+        updated = update_search_vectors()
+        self.stdout.write(f'Updated {updated} recipes.')
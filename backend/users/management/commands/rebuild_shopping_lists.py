@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users import shopping_list
+from users.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the materialized shopping lists from the carts, or '
+            'verify that they are consistent.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append',
+                            dest='users',
+                            help='Only process this user id.')
+        parser.add_argument('--verify', action='store_true',
+                            help='Report differences without changing '
+                                 'anything.')
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            self.verify(options['users'])
+        else:
+            self.rebuild(options['users'])
+
+    def rebuild(self, user_ids):
+        created = shopping_list.rebuild(user_ids)
+        self.stdout.write(f'Rebuilt {created} shopping list items.')
+
+    def verify(self, user_ids):
+        items = ShoppingListItem.objects.all()
+        if user_ids is not None:
+            items = items.filter(user_id__in=user_ids)
+        actual = {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total in items.values_list(
+                'user_id', 'ingredient_id', 'total_amount').iterator()
+        }
+        mismatches = 0
+        for user_id, ingredient_id, total in shopping_list.expected_items(
+                user_ids):
+            found = actual.pop((user_id, ingredient_id), None)
+            if found != total:
+                mismatches += 1
+                self.stdout.write(
+                    f'user {user_id}, ingredient {ingredient_id}: '
+                    f'expected {total}, found {found}')
+        for (user_id, ingredient_id), total in actual.items():
+            mismatches += 1
+            self.stdout.write(
+                f'user {user_id}, ingredient {ingredient_id}: '
+                f'expected nothing, found {total}')
+        if mismatches:
+            raise CommandError(
+                f'{mismatches} shopping list items are inconsistent.')
+        self.stdout.write(self.style.SUCCESS('Shopping lists are consistent.'))
@@ -0,0 +1,31 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from users import similarity
+
+
+def available_cpus():
+    # Honours the CPU set of the container, unlike os.cpu_count().
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+class Command(BaseCommand):
+    help = ('Recompute the most similar recipes of every recipe from '
+            'TF-IDF weighted ingredients and tags.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=available_cpus())
+        parser.add_argument('--batch-size', type=int,
+                            default=similarity.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = similarity.rebuild(batch_size=options['batch_size'],
+                                     workers=options['workers'])
+        self.stdout.write(
+            f'Stored {written} similar recipes in '
+            f'{time.perf_counter() - started:.1f} s.')
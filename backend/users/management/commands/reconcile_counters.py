@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from users import counters
+
+
+class Command(BaseCommand):
+    help = ('Recount favorites, carts, recipes and subscribers and fix '
+            'counter columns that drifted.')
+
+    def handle(self, *args, **options):
+        for counter, fixed in counters.reconcile().items():
+            self.stdout.write(f'{counter}: fixed {fixed} rows.')
@@ -0,0 +1,50 @@
+# Generated by Django 3.2.16 on 2026-10-18 04:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_shopping_lists(apps, schema_editor):
+    ShoppingCart = apps.get_model('users', 'ShoppingCart')
+    ShoppingListItem = apps.get_model('users', 'ShoppingListItem')
+    rows = (
+        ShoppingCart.objects
+        .filter(recipe__ingredients_in_recipe__isnull=False)
+        .values('user_id', 'recipe__ingredients_in_recipe__ingredient_id')
+        .annotate(total=models.Sum('recipe__ingredients_in_recipe__amount'))
+        .filter(total__gt=0)
+        .order_by()
+    )
+    ShoppingListItem.objects.bulk_create(
+        (ShoppingListItem(
+            user_id=row['user_id'],
+            ingredient_id=row['recipe__ingredients_in_recipe__ingredient_id'],
+            total_amount=row['total'])
+         for row in rows.iterator()),
+        batch_size=5000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0011_recipeingredient_cart_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_amount', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='users.ingredient')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'ingredient')},
+            },
+        ),
+        migrations.RunPython(build_shopping_lists, migrations.RunPython.noop),
+    ]
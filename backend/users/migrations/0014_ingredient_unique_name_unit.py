@@ -0,0 +1,65 @@
+# Generated by Django 3.2.16 on 2026-10-18 04:39
+
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicates(apps, schema_editor):
+    """Point rows at the first of equal ingredients and drop the rest."""
+    Ingredient = apps.get_model('users', 'Ingredient')
+    RecipeIngredient = apps.get_model('users', 'RecipeIngredient')
+    ShoppingCart = apps.get_model('users', 'ShoppingCart')
+    ShoppingListItem = apps.get_model('users', 'ShoppingListItem')
+    groups = (Ingredient.objects.values('name', 'measurement_unit')
+              .annotate(keep_id=Min('id'), total=Count('id'))
+              .filter(total__gt=1))
+    for group in groups:
+        keep_id = group['keep_id']
+        duplicates = Ingredient.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).exclude(id=keep_id)
+        RecipeIngredient.objects.filter(ingredient__in=duplicates).update(
+            ingredient_id=keep_id)
+        # A recipe that listed two of the duplicates keeps its first row
+        # only, as CreateRecipeSerializer.set_ingredients does; the
+        # amounts are not added up.
+        for row in (RecipeIngredient.objects.filter(ingredient_id=keep_id)
+                    .values('recipe_id')
+                    .annotate(rows=Count('id'), first_id=Min('id'))
+                    .filter(rows__gt=1)):
+            RecipeIngredient.objects.filter(
+                recipe_id=row['recipe_id'], ingredient_id=keep_id
+            ).exclude(id=row['first_id']).delete()
+        items = ShoppingListItem.objects.filter(
+            ingredient__in=duplicates) | ShoppingListItem.objects.filter(
+            ingredient_id=keep_id)
+        user_ids = set(items.values_list('user_id', flat=True))
+        items.delete()
+        # The lists are recounted from the carts, now without duplicates.
+        totals = (
+            ShoppingCart.objects
+            .filter(user_id__in=user_ids,
+                    recipe__ingredients_in_recipe__ingredient_id=keep_id)
+            .values('user_id')
+            .annotate(total=Sum('recipe__ingredients_in_recipe__amount'))
+        )
+        ShoppingListItem.objects.bulk_create(
+            ShoppingListItem(user_id=item['user_id'], ingredient_id=keep_id,
+                             total_amount=item['total'])
+            for item in totals)
+        duplicates.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0013_ingredient_name_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='ingredient',
+            unique_together={('name', 'measurement_unit')},
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 3.2.16 on 2026-10-18 04:43
+
+import datetime
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def spread_pub_dates(apps, schema_editor):
+    """Give existing recipes distinct dates in id order.
+
+    They all got the same default, which would make every cursor page
+    fall back to an offset within that single timestamp.
+    """
+    Recipe = apps.get_model('users', 'Recipe')
+    recipes = list(Recipe.objects.order_by('id').only('id'))
+    now = django.utils.timezone.now()
+    for position, recipe in enumerate(recipes):
+        recipe.pub_date = now - datetime.timedelta(
+            microseconds=len(recipes) - position)
+    Recipe.objects.bulk_update(recipes, ['pub_date'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0014_ingredient_unique_name_unit'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='recipe',
+            options={'ordering': ['-pub_date', '-id']},
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='pub_date',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date', '-id'], name='recipe_pub_date_idx'),
+        ),
+        migrations.RunPython(spread_pub_dates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.2.16 on 2026-10-18 04:46
+
+from django.db import migrations
+from django.db.models import Min
+
+
+def delete_duplicates(apps, schema_editor):
+    TagRecipe = apps.get_model('users', 'TagRecipe')
+    keep = (TagRecipe.objects.values('tag', 'recipe')
+            .annotate(keep_id=Min('id')).values('keep_id'))
+    TagRecipe.objects.exclude(id__in=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0015_recipe_pub_date'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicates, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='tagrecipe',
+            unique_together={('tag', 'recipe')},
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.2.16 on 2026-10-18 04:52
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def count_references(apps, schema_editor):
+    Recipe = apps.get_model('users', 'Recipe')
+    User = apps.get_model('users', 'User')
+    MediaFile = apps.get_model('users', 'MediaFile')
+    references = Counter(
+        Recipe.objects.exclude(image='').values_list('image', flat=True))
+    references.update(
+        User.objects.exclude(avatar='').values_list('avatar', flat=True))
+    MediaFile.objects.bulk_create(
+        (MediaFile(name=name, references=count)
+         for name, count in references.items()),
+        batch_size=5000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0018_image_srcset'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('references', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
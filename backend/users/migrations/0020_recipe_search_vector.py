@@ -0,0 +1,52 @@
+# Generated by Django 3.2.16 on 2026-10-18 04:57
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+
+UPDATE_SEARCH_VECTORS = """
+UPDATE users_recipe recipe SET search_vector =
+    setweight(to_tsvector(%(config)s::regconfig, recipe.name), 'A')
+    || setweight(to_tsvector(%(config)s::regconfig, coalesce((
+        SELECT string_agg(ingredient.name, ' ')
+        FROM users_recipeingredient item
+        JOIN users_ingredient ingredient
+            ON ingredient.id = item.ingredient_id
+        WHERE item.recipe_id = recipe.id
+    ), '')), 'B')
+    || setweight(to_tsvector(%(config)s::regconfig, recipe.text), 'C')
+"""
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(UPDATE_SEARCH_VECTORS,
+                          {'config': settings.RECIPE_SEARCH_CONFIG})
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS recipe_search_idx '
+        'ON users_recipe USING gin (search_vector)'
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS recipe_search_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0019_mediafile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
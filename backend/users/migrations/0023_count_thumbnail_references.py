@@ -0,0 +1,39 @@
+# Generated by Django 3.2.16 on 2026-10-18 09:12
+
+from collections import Counter
+
+from django.db import migrations
+
+
+def count_references(apps, schema_editor):
+    Recipe = apps.get_model('users', 'Recipe')
+    User = apps.get_model('users', 'User')
+    MediaFile = apps.get_model('users', 'MediaFile')
+    references = Counter()
+    for srcsets in (
+            Recipe.objects.values_list('image_srcset', flat=True),
+            User.objects.values_list('avatar_srcset', flat=True)):
+        for srcset in srcsets.iterator():
+            for key, thumbnails in srcset.items():
+                if key != 'source':
+                    references.update(thumbnails.values())
+    MediaFile.objects.bulk_create(
+        (MediaFile(name=name) for name in references),
+        batch_size=5000, ignore_conflicts=True
+    )
+    by_count = {}
+    for name, count in references.items():
+        by_count.setdefault(count, []).append(name)
+    for count, names in by_count.items():
+        MediaFile.objects.filter(name__in=names).update(references=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0022_feed'),
+    ]
+
+    operations = [
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,34 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
 
 
-class User(AbstractUser):
+class CounterFieldsMixin:
+    """Keep ``save()`` from overwriting counters maintained with F().
+
+    Counter columns are only changed by ``users.counters``; saving an
+    existing instance writes every other field, so a stale in-memory
+    counter never replaces the value in the database.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and not args
+                and kwargs.get('update_fields') is None):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(CounterFieldsMixin, AbstractUser):
     username = models.CharField(
         max_length=150,
         unique=True
@@ -14,7 +40,12 @@ class User(AbstractUser):
     first_name = models.CharField(max_length=150)
     last_name = models.CharField(max_length=150)
     avatar = models.ImageField(upload_to='users/avatar/')
+    avatar_srcset = models.JSONField(default=dict, blank=True)
     is_subscribed = models.BooleanField(default=False)
+    recipes_count = models.IntegerField(default=0)
+    subscribers_count = models.IntegerField(default=0)
+
+    counter_fields = ('recipes_count', 'subscribers_count')
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = (
@@ -41,8 +72,61 @@ class Ingredient(models.Model):
     name = models.CharField(max_length=128)
     measurement_unit = models.CharField(max_length=64)
 
+    class Meta:
+        unique_together = ('name', 'measurement_unit')
+
+
+class RecipeQuerySet(models.QuerySet):
+
+    def with_related(self):
+        return self.select_related('author').prefetch_related(
+            'tags', 'ingredients_in_recipe__ingredient')
+
+    def with_user_flags(self, user):
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=models.Value(
+                    False, output_field=models.BooleanField()),
+                is_in_shopping_cart=models.Value(
+                    False, output_field=models.BooleanField()),
+                author_subscribed=models.Value(
+                    False, output_field=models.BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=models.Exists(Favorite.objects.filter(
+                user=user, recipe=models.OuterRef('pk'))),
+            is_in_shopping_cart=models.Exists(ShoppingCart.objects.filter(
+                user=user, recipe=models.OuterRef('pk'))),
+            author_subscribed=models.Exists(Subscription.objects.filter(
+                user=user, author=models.OuterRef('author'))),
+        )
+
+    def latest_by_author(self, author_ids, limit=None):
+        """Return the ``limit`` newest recipes of each author in one query."""
+        recipes = self.filter(author_id__in=author_ids)
+        if limit is None:
+            return recipes
+        ranked = recipes.annotate(row_number=models.Window(
+            expression=RowNumber(),
+            partition_by=[models.F('author_id')],
+            order_by=[models.F('pub_date').desc(), models.F('id').desc()]
+        )).order_by().values('id', 'row_number')
+        sql, params = ranked.query.sql_with_params()
+        return self.filter(id__in=RawSQL(
+            f'SELECT ranked.id FROM ({sql}) ranked '
+            f'WHERE ranked.row_number <= %s',
+            (*params, limit)
+        ))
 
-class Recipe(models.Model):
+
+class RecipeManager(models.Manager.from_queryset(RecipeQuerySet)):
+
+    def get_queryset(self):
+        # The search document is only needed inside the database.
+        return super().get_queryset().defer('search_vector')
+
+
+class Recipe(CounterFieldsMixin, models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE,
                                related_name='recipe_author')
     ingredients = models.ManyToManyField(Ingredient, related_name='recipes',
@@ -51,14 +135,40 @@ class Recipe(models.Model):
                                   through='TagRecipe')
     name = models.CharField(max_length=256)
     image = models.ImageField(upload_to='recipes/image/')
+    image_srcset = models.JSONField(default=dict, blank=True)
     text = models.TextField()
     cooking_time = models.IntegerField()
+    pub_date = models.DateTimeField(auto_now_add=True)
+    favorites_count = models.IntegerField(default=0)
+    cart_count = models.IntegerField(default=0)
+    # Whether the recipe was copied into followers' feeds (users.feed).
+    fanned_out = models.BooleanField(default=False)
+    # Maintained by users.search; indexed with GIN on PostgreSQL.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    counter_fields = ('favorites_count', 'cart_count')
+
+    objects = RecipeManager()
+
+    class Meta:
+        ordering = ['-pub_date', '-id']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_idx'),
+            # Recipes the feed pulls on read.
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         condition=models.Q(fanned_out=False),
+                         name='recipe_pull_feed_idx'),
+        ]
 
 
 class TagRecipe(models.Model):
     tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
 
+    class Meta:
+        unique_together = ('tag', 'recipe')
+
 
 class RecipeIngredient(models.Model):
     recipe = models.ForeignKey(Recipe, related_name='ingredients_in_recipe',
@@ -66,6 +176,13 @@ class RecipeIngredient(models.Model):
     ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE)
     amount = models.IntegerField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['recipe', 'ingredient'],
+                         include=['amount'],
+                         name='recipeingredient_cart_idx'),
+        ]
+
 
 class Favorite(models.Model):
     recipe = models.ForeignKey(Recipe, related_name='favorited_by',
@@ -91,6 +208,59 @@ class ShoppingCart(models.Model):
                              on_delete=models.CASCADE)
     recipe = models.ForeignKey(Recipe, related_name='shopping_carts',
                                on_delete=models.CASCADE)
+    added_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'recipe')
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(User, related_name='shopping_list',
+                             on_delete=models.CASCADE)
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE)
+    total_amount = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'ingredient')
+
+
+class MediaFile(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+    references = models.IntegerField(default=0)
+
+
+class SimilarRecipe(models.Model):
+    """Precomputed nearest neighbours of a recipe, see users.similarity."""
+
+    recipe = models.ForeignKey(Recipe, related_name='similar_recipes',
+                               on_delete=models.CASCADE)
+    similar = models.ForeignKey(Recipe, related_name='+',
+                                on_delete=models.CASCADE)
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ('recipe', 'similar')
+        indexes = [
+            models.Index(fields=['recipe', '-score'],
+                         name='similar_recipe_score_idx'),
+        ]
+
+
+class FeedItem(models.Model):
+    """A recipe in the feed of one of its author's followers."""
+
+    user = models.ForeignKey(User, related_name='feed',
+                             on_delete=models.CASCADE)
+    recipe = models.ForeignKey(Recipe, related_name='+',
+                               on_delete=models.CASCADE)
+    author = models.ForeignKey(User, related_name='+',
+                               on_delete=models.CASCADE)
+    pub_date = models.DateTimeField()
 
     class Meta:
         unique_together = ('user', 'recipe')
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-recipe'],
+                         name='feeditem_user_pub_date_idx'),
+        ]
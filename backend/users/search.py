@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector
+)
+from django.db import connection
+from django.db.models import F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save
+
+from users.models import Ingredient, Recipe, RecipeIngredient
+
+
+def search_vector():
+    """Weighted document: name (A), ingredient names (B), text (C)."""
+    config = settings.RECIPE_SEARCH_CONFIG
+    ingredient_names = (
+        RecipeIngredient.objects.filter(recipe=OuterRef('pk'))
+        .order_by().values('recipe')
+        .annotate(names=StringAgg('ingredient__name', ' '))
+        .values('names')
+    )
+    return (
+        SearchVector('name', weight='A', config=config)
+        + SearchVector(Coalesce(Subquery(ingredient_names), Value('')),
+                       weight='B', config=config)
+        + SearchVector('text', weight='C', config=config)
+    )
+
+
+def update_search_vectors(recipe_ids=None):
+    """Recompute ``Recipe.search_vector`` (PostgreSQL only)."""
+    if connection.vendor != 'postgresql':
+        return 0
+    recipes = Recipe.objects.all()
+    if recipe_ids is not None:
+        recipes = recipes.filter(id__in=recipe_ids)
+    return recipes.update(search_vector=search_vector())
+
+
+def refresh_ingredient_recipes(sender, instance, created, raw=False,
+                               **kwargs):
+    # A renamed ingredient changes the documents of its recipes. The
+    # API and the recipe admin refresh the recipes they write; other
+    # writes need the rebuild_search_vectors command.
+    if not created and not raw:
+        update_search_vectors(RecipeIngredient.objects.filter(
+            ingredient=instance).values_list('recipe_id', flat=True))
+
+
+def connect():
+    post_save.connect(refresh_ingredient_recipes, sender=Ingredient,
+                      dispatch_uid='search_Ingredient_save')
+
+
+def search_recipes(queryset, text):
+    """Filter ``queryset`` by ``text`` and order it by relevance.
+
+    Uses the GIN-indexed ``search_vector`` on PostgreSQL; other
+    databases fall back to an unranked substring match.
+    """
+    if connection.vendor != 'postgresql':
+        return queryset.filter(Q(name__icontains=text)
+                               | Q(text__icontains=text))
+    query = SearchQuery(text, search_type='websearch',
+                        config=settings.RECIPE_SEARCH_CONFIG)
+    return queryset.filter(search_vector=query).annotate(
+        rank=SearchRank(F('search_vector'), query)
+    ).order_by('-rank', '-pub_date', '-id')
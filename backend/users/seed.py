@@ -0,0 +1,85 @@
+import random
+
+from users import counters, feed, shopping_list, similarity
+from users.catalog import DEFAULT_INGREDIENTS_CSV, read_csv
+from users.models import (
+    User,
+    Subscription,
+    Tag,
+    ShoppingCart,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    TagRecipe,
+    Favorite
+)
+
+TAGS = (
+    ('Завтрак', 'breakfast'),
+    ('Обед', 'lunch'),
+    ('Ужин', 'dinner'),
+)
+
+
+def seed_dataset(users=20, recipes=200, ingredients_per_recipe=8,
+                 favorites=10, cart=5, subscriptions=5,
+                 ingredients_csv=DEFAULT_INGREDIENTS_CSV, seed=0):
+    """Fill an empty database with a synthetic, reproducible dataset."""
+    rnd = random.Random(seed)
+
+    Ingredient.objects.bulk_create(
+        Ingredient(name=name, measurement_unit=unit)
+        for name, unit in read_csv(ingredients_csv)
+    )
+    ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+    Tag.objects.bulk_create(
+        Tag(name=name, slug=slug) for name, slug in TAGS)
+    tag_ids = list(Tag.objects.values_list('id', flat=True))
+
+    User.objects.bulk_create(
+        User(username=f'user{i}', email=f'user{i}@example.com',
+             first_name='Bench', last_name=f'User{i}')
+        for i in range(users)
+    )
+    user_ids = list(User.objects.values_list('id', flat=True))
+
+    Recipe.objects.bulk_create(
+        Recipe(author_id=rnd.choice(user_ids), name=f'Recipe {i}',
+               image='recipes/image/bench.png', text='Benchmark recipe.',
+               cooking_time=rnd.randint(1, 120))
+        for i in range(recipes)
+    )
+    recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                         amount=rnd.randint(1, 500))
+        for recipe_id in recipe_ids
+        for ingredient_id in rnd.sample(
+            ingredient_ids, min(ingredients_per_recipe, len(ingredient_ids)))
+    )
+    TagRecipe.objects.bulk_create(
+        TagRecipe(recipe_id=recipe_id, tag_id=tag_id)
+        for recipe_id in recipe_ids
+        for tag_id in rnd.sample(tag_ids, rnd.randint(1, len(tag_ids)))
+    )
+
+    for model, per_user in ((Favorite, favorites), (ShoppingCart, cart)):
+        model.objects.bulk_create(
+            model(user_id=user_id, recipe_id=recipe_id)
+            for user_id in user_ids
+            for recipe_id in rnd.sample(
+                recipe_ids, min(per_user, len(recipe_ids)))
+        )
+    Subscription.objects.bulk_create(
+        Subscription(user_id=user_id, author_id=author_id)
+        for user_id in user_ids
+        for author_id in rnd.sample(
+            [pk for pk in user_ids if pk != user_id],
+            min(subscriptions, len(user_ids) - 1))
+    )
+    shopping_list.rebuild()
+    counters.reconcile()
+    feed.fan_out_pending()
+    similarity.rebuild()
+    return User.objects.get(pk=user_ids[0])
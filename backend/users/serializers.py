@@ -1,11 +1,13 @@
-import base64
+from operator import attrgetter
 
 from djoser.serializers import UserSerializer
+from django.conf import settings
 from django.contrib.auth.password_validation import validate_password
 from django.core.validators import RegexValidator
-from django.core.files.base import ContentFile
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
+from users import images, search, shopping_list, similarity
 from users.models import (
     User,
     Subscription,
@@ -21,9 +23,12 @@ from users.models import (
 class Base64ImageField(serializers.ImageField):
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='image.' + ext)
+            try:
+                data = images.decode_base64_image(
+                    data, settings.IMAGE_MAX_UPLOAD_SIZE)
+                images.check_image(data)
+            except images.ImageError as error:
+                raise serializers.ValidationError(str(error))
 
         return super().to_internal_value(data)
 
@@ -31,6 +36,7 @@ class Base64ImageField(serializers.ImageField):
 class CustomUserSerializer(UserSerializer):
     is_subscribed = serializers.SerializerMethodField()
     avatar = serializers.ImageField(read_only=True)
+    avatar_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -41,16 +47,21 @@ class CustomUserSerializer(UserSerializer):
             'first_name',
             'last_name',
             'avatar',
+            'avatar_srcset',
             'is_subscribed'
         )
 
+    def get_avatar_srcset(self, obj):
+        return images.srcset(obj)
+
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'subscribed'):
+            return obj.subscribed
         request = self.context.get('request')
-        is_subscribed = Subscription.objects.filter(
+        if request is None or request.user.is_anonymous:
+            return False
+        return Subscription.objects.filter(
             user=request.user, author=obj).exists()
-        if is_subscribed:
-            return True
-        return False
 
 
 class UserCreateSerializer(serializers.ModelSerializer):
@@ -118,6 +129,7 @@ class RetrieveRecipeSerializer(serializers.ModelSerializer):
     author = CustomUserSerializer(read_only=True)
     ingredients = serializers.SerializerMethodField()
     image = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -132,10 +144,16 @@ class RetrieveRecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_srcset',
             'text',
             'cooking_time'
         )
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_subscribed'):
+            instance.author.subscribed = instance.author_subscribed
+        return super().to_representation(instance)
+
     def get_ingredients(self, obj):
         ingredients = []
         for recipe in obj.ingredients_in_recipe.all():
@@ -149,12 +167,16 @@ class RetrieveRecipeSerializer(serializers.ModelSerializer):
         return ingredients
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
         return Favorite.objects.filter(user=user, recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
@@ -165,9 +187,12 @@ class RetrieveRecipeSerializer(serializers.ModelSerializer):
             return obj.image.url
         return ''
 
+    def get_image_srcset(self, obj):
+        return images.srcset(obj)
+
 
 class CreateRecipeIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
 
     class Meta:
         model = RecipeIngredient
@@ -183,41 +208,90 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
     ingredients = CreateRecipeIngredientSerializer(many=True)
 
     def to_representation(self, instance):
+        instance = Recipe.objects.with_related().with_user_flags(
+            self.context['request'].user).get(pk=instance.pk)
         return RetrieveRecipeSerializer(instance, context=self.context).data
 
+    def validate_ingredients(self, value):
+        ids = [ingredient['id'] for ingredient in value]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError(
+                'Ингредиенты не должны повторяться.')
+        missing = set(ids) - set(
+            Ingredient.objects.filter(id__in=ids).values_list(
+                'id', flat=True))
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не найдены: '
+                f'{", ".join(map(str, sorted(missing)))}.')
+        return value
+
+    def validate(self, data):
+        for field in ('ingredients', 'tags'):
+            if field not in data:
+                raise serializers.ValidationError(
+                    {field: 'Поле обязательно.'})
+        return data
+
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(**validated_data)
-        for ingredient in ingredients:
-            get_ingredient = Ingredient.objects.get(pk=ingredient['id'].id)
-            RecipeIngredient.objects.create(
-                recipe=recipe,
-                ingredient=get_ingredient,
-                amount=ingredient['amount']
-            )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient_id=ingredient['id'],
+                             amount=ingredient['amount'])
+            for ingredient in ingredients
+        )
         recipe.tags.set(tags)
+        search.update_search_vectors([recipe.id])
+        similarity.schedule_refresh(recipe.id)
         return recipe
 
+    def set_ingredients(self, recipe, ingredients):
+        """Replace ``recipe``'s ingredients, touching only changed rows."""
+        amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        existing = set()
+        to_delete = []
+        to_update = []
+        # Of duplicate rows the first one is kept, like migration 0014
+        # does for merged ingredients.
+        rows = sorted(recipe.ingredients_in_recipe.all(),
+                      key=attrgetter('id'))
+        for row in rows:
+            if (row.ingredient_id not in amounts
+                    or row.ingredient_id in existing):
+                to_delete.append(row.id)
+                continue
+            existing.add(row.ingredient_id)
+            if row.amount != amounts[row.ingredient_id]:
+                row.amount = amounts[row.ingredient_id]
+                to_update.append(row)
+        if to_delete:
+            RecipeIngredient.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient_id=ingredient_id,
+                             amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing
+        )
+
+    @transaction.atomic
     def update(self, instance, validated_data):
-        tags = validated_data.pop('tags', None)
-        ingredients = validated_data.pop('ingredients', None)
+        old_amounts = shopping_list.recipe_amounts(instance)
+        tags = validated_data.pop('tags')
+        ingredients = validated_data.pop('ingredients')
         recipe = super().update(instance, validated_data)
-
-        if ingredients is None:
-            raise serializers.ValidationError(
-                {'ingredients': 'Поле обязательно.'})
-        if tags is None:
-            raise serializers.ValidationError({'tags': 'Поле обязательно.'})
-
-        for ingredient in ingredients:
-            get_ingredient = Ingredient.objects.get(pk=ingredient['id'].id)
-            RecipeIngredient.objects.create(
-                recipe=recipe,
-                ingredient=get_ingredient,
-                amount=ingredient['amount']
-            )
+        self.set_ingredients(recipe, ingredients)
         recipe.tags.set(tags)
+        shopping_list.recipe_changed(recipe, old_amounts)
+        search.update_search_vectors([recipe.id])
+        similarity.schedule_refresh(recipe.id)
 
         return recipe
 
@@ -244,10 +318,14 @@ class FavoriteSerializer(serializers.ModelSerializer):
 
 
 class RecipeShortInfoSerializer(serializers.ModelSerializer):
+    image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_srcset', 'cooking_time')
+
+    def get_image_srcset(self, obj):
+        return images.srcset(obj)
 
 
 class SubscriptionSerializer(serializers.ModelSerializer):
@@ -287,12 +365,18 @@ class RetrieveSubscriptionSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'subscribed'):
+            return obj.subscribed
         request = self.context.get('request')
         return Subscription.objects.filter(
             user=request.user, author=obj).exists()
 
     def get_recipes(self, obj):
         request = self.context.get('request')
+        if 'recipes' in self.context:
+            return RecipeShortInfoSerializer(
+                self.context['recipes'].get(obj.id, []), many=True,
+                context={'request': request}).data
         recipes = obj.recipe_author.all()
         limit = request.query_params.get('recipes_limit')
         if limit and limit.isdigit():
@@ -314,6 +398,17 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
         ]
 
 
+class BulkIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_MAX_IDS
+    )
+
+    def validate_ids(self, value):
+        return list(dict.fromkeys(value))
+
+
 class CreateSubscriptionSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -0,0 +1,154 @@
+from django.db import connection, transaction
+from django.db.models import F, IntegerField, Sum
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Now
+from django.db.models.signals import pre_delete
+
+from users.models import (
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    ShoppingListItem
+)
+
+BATCH_SIZE = 5000
+
+
+def recipe_amounts(recipe):
+    """Return ``{ingredient_id: amount}`` summed over ``recipe``'s rows."""
+    return recipes_amounts([recipe.pk])
+
+
+def amounts_queryset(recipe_ids):
+    """``(ingredient_id, total)`` rows of several recipes.
+
+    On PostgreSQL this is an index-only scan of recipeingredient_cart_idx.
+    """
+    return (
+        RecipeIngredient.objects
+        .filter(recipe_id__in=recipe_ids)
+        .values('ingredient_id')
+        .annotate(total=Sum('amount'))
+        .values_list('ingredient_id', 'total')
+    )
+
+
+def recipes_amounts(recipe_ids):
+    """Return ``{ingredient_id: amount}`` summed over several recipes."""
+    return dict(amounts_queryset(recipe_ids))
+
+
+def negated(amounts):
+    return {pk: -amount for pk, amount in amounts.items()}
+
+
+def apply_deltas(user_ids, deltas):
+    """Add ``{ingredient_id: delta}`` to the shopping lists of ``user_ids``.
+
+    Rows are created for ingredients that gain an amount, every affected
+    row is adjusted with a single F() update and rows that drop to zero
+    are removed.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    user_ids = list(user_ids)
+    if not deltas or not user_ids:
+        return
+    with transaction.atomic():
+        ShoppingListItem.objects.bulk_create(
+            [ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id)
+             for user_id in user_ids
+             for ingredient_id, delta in deltas.items() if delta > 0],
+            ignore_conflicts=True
+        )
+        items = ShoppingListItem.objects.filter(
+            user_id__in=user_ids, ingredient_id__in=deltas)
+        # Django resolves every When() separately, which is slow for
+        # the hundreds of ingredients of a bulk cart change.
+        column = connection.ops.quote_name('ingredient_id')
+        items.update(
+            total_amount=F('total_amount') + RawSQL(
+                f'CASE {column} {"WHEN %s THEN %s " * len(deltas)}'
+                'ELSE 0 END',
+                [value for item in deltas.items() for value in item],
+                output_field=IntegerField()
+            ),
+            updated_at=Now()
+        )
+        items.filter(total_amount__lte=0).delete()
+
+
+def cart_user_ids(recipe):
+    return ShoppingCart.objects.filter(
+        recipe=recipe).values_list('user_id', flat=True)
+
+
+def add_recipe(user, recipe):
+    apply_deltas([user.id], recipe_amounts(recipe))
+
+
+def add_recipes(user, recipe_ids):
+    apply_deltas([user.id], recipes_amounts(recipe_ids))
+
+
+def remove_recipes(user, recipe_ids):
+    apply_deltas([user.id], negated(recipes_amounts(recipe_ids)))
+
+
+def recipe_changed(recipe, old_amounts):
+    """Propagate a change of ``recipe``'s ingredients to every cart."""
+    new_amounts = recipe_amounts(recipe)
+    apply_deltas(cart_user_ids(recipe), {
+        ingredient_id: (new_amounts.get(ingredient_id, 0)
+                        - old_amounts.get(ingredient_id, 0))
+        for ingredient_id in old_amounts.keys() | new_amounts.keys()
+    })
+
+
+def recipe_deleted(recipe):
+    apply_deltas(cart_user_ids(recipe), negated(recipe_amounts(recipe)))
+
+
+def remove_deleted_recipe(sender, instance, **kwargs):
+    # Before the delete, while the recipe's cart and ingredient rows
+    # exist; covers the admin and the cascade from a deleted author.
+    recipe_deleted(instance)
+
+
+def expected_items(user_ids=None):
+    """Yield ``(user_id, ingredient_id, total)`` computed from the carts."""
+    carts = ShoppingCart.objects.all()
+    if user_ids is not None:
+        carts = carts.filter(user_id__in=user_ids)
+    rows = (
+        carts
+        .filter(recipe__ingredients_in_recipe__isnull=False)
+        .values('user_id', 'recipe__ingredients_in_recipe__ingredient_id')
+        .annotate(total=Sum('recipe__ingredients_in_recipe__amount'))
+        .filter(total__gt=0)
+        .order_by()
+        .values_list('user_id',
+                     'recipe__ingredients_in_recipe__ingredient_id',
+                     'total')
+    )
+    return rows.iterator()
+
+
+@transaction.atomic
+def rebuild(user_ids=None):
+    """Recompute the shopping lists of ``user_ids`` (all users by default)."""
+    items = ShoppingListItem.objects.all()
+    if user_ids is not None:
+        items = items.filter(user_id__in=user_ids)
+    items.delete()
+    created = ShoppingListItem.objects.bulk_create(
+        (ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                          total_amount=total)
+         for user_id, ingredient_id, total in expected_items(user_ids)),
+        batch_size=BATCH_SIZE
+    )
+    return len(created)
+
+
+def connect():
+    pre_delete.connect(remove_deleted_recipe, sender=Recipe,
+                       dispatch_uid='shopping_list_recipe_delete')
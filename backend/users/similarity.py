@@ -0,0 +1,374 @@
+import io
+import logging
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.db.models import Count, Max, Min
+from scipy import sparse
+
+from users.models import Recipe, RecipeIngredient, SimilarRecipe, TagRecipe
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+CANDIDATE_LIMIT = 5000
+CHUNK_SIZE = 100000
+DF_CACHE_KEY = 'similarity:df'
+DF_CACHE_TIMEOUT = 3600
+# Ingredients found in a large share of recipes (salt, water, sugar)
+# say little about similarity and would make nearly every pair a
+# candidate, so they are left out like sklearn's ``max_df`` does.
+MAX_DF = 0.01
+MIN_DF_LIMIT = 1000
+STAGING_TABLE = 'similar_recipe_rebuild'
+TAG_WEIGHT = 0.5
+
+# Vectors shared with forked rebuild workers.
+_vectors = None
+
+# One worker per process applies incremental refreshes in order.
+executor = ThreadPoolExecutor(max_workers=1,
+                              thread_name_prefix='similarity')
+
+
+def df_limit(total):
+    return max(MAX_DF * total, MIN_DF_LIMIT)
+
+
+def binary_matrix(rows, columns, shape):
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows)), (rows, columns)), shape=shape)
+    # Duplicate rows were summed; a feature either occurs or not.
+    matrix.data[:] = 1
+    return matrix
+
+
+def tfidf(matrix, df, total, scale=1.0, max_df=None):
+    """Weight a binary matrix with smoothed IDF, dropping frequent
+    columns."""
+    weights = (np.log((1 + total) / (1 + df)) + 1) * scale
+    if max_df is not None:
+        weights[df > max_df] = 0
+    matrix = (matrix @ sparse.diags(weights, shape=(len(df), len(df))))
+    matrix = matrix.tocsr()
+    matrix.eliminate_zeros()
+    return matrix
+
+
+def vectorize(ingredients, tags):
+    """Scale rows to unit length over ingredient and tag weights.
+
+    Returns ``(ingredients, ingredients transposed, tag groups, tag
+    group products, row scales)``. Ingredients stay sparse. Tags are
+    few and repeat in a handful of combinations, so each row keeps
+    the index of its combination and tag dot products are looked up
+    in a small combination-by-combination table.
+    """
+    tags = tags.toarray()
+    squares = (np.asarray(ingredients.multiply(ingredients).sum(axis=1))
+               .ravel() + (tags ** 2).sum(axis=1))
+    norms = np.sqrt(squares)
+    norms[norms == 0] = 1
+    scales = 1 / norms
+    combinations, groups = np.unique(tags, axis=0, return_inverse=True)
+    ingredients = (sparse.diags(scales) @ ingredients).tocsr()
+    return (ingredients, ingredients.T.tocsr(), groups.ravel(),
+            combinations @ combinations.T, scales)
+
+
+def neighbours(vectors, start, stop, k):
+    """Return the top ``k`` cosine neighbours of rows ``start:stop``.
+
+    Only pairs sharing an ingredient are scored: the sparse product
+    finds them and the tag part is added for those pairs alone.
+    Returns ``(rows, columns, scores)`` ordered by row and score.
+    """
+    ingredients, transposed, groups, tag_products, scales = vectors
+    product = (ingredients[start:stop] @ transposed).tocsr()
+    rows = np.repeat(np.arange(start, stop), np.diff(product.indptr))
+    columns = product.indices
+    scores = product.data + (tag_products[groups[rows], groups[columns]]
+                             * scales[rows] * scales[columns])
+    scores[rows == columns] = -np.inf
+    best = []
+    for offset in range(stop - start):
+        low, high = product.indptr[offset], product.indptr[offset + 1]
+        row_scores = scores[low:high]
+        top = np.arange(high - low)
+        if len(top) > k:
+            top = np.argpartition(row_scores, -k)[-k:]
+        top = top[np.lexsort((columns[low:high][top], -row_scores[top]))]
+        best.append(low + top[row_scores[top] > -np.inf])
+    best = np.concatenate(best) if best else np.empty(0, dtype=np.int64)
+    return rows[best], columns[best], scores[best]
+
+
+def rebuild_batch(bounds):
+    return neighbours(_vectors, *bounds)
+
+
+def load_pairs(model, field, **filters):
+    values = model.objects.filter(**filters).values_list('recipe_id', field)
+    pairs = np.fromiter(
+        chain.from_iterable(values.iterator(chunk_size=CHUNK_SIZE)),
+        dtype=np.int64)
+    return pairs[0::2], pairs[1::2]
+
+
+def encode(recipe_ids, recipes, features):
+    """Map ids to matrix rows and columns; return them with the sorted
+    feature ids."""
+    rows = np.searchsorted(recipe_ids, recipes)
+    known = rows < len(recipe_ids)
+    known[known] = recipe_ids[rows[known]] == recipes[known]
+    feature_ids, columns = np.unique(features[known], return_inverse=True)
+    return rows[known], columns, feature_ids
+
+
+def document_frequencies():
+    """Return ``(total, ingredient df, tag df)``, cached for an hour.
+
+    Document frequencies drift slowly, so incremental refreshes reuse
+    them instead of counting the whole table on every save.
+    """
+    frequencies = cache.get(DF_CACHE_KEY)
+    if frequencies is None:
+        frequencies = (
+            Recipe.objects.count(),
+            dict(RecipeIngredient.objects.order_by().values('ingredient_id')
+                 .annotate(df=Count('recipe_id', distinct=True))
+                 .values_list('ingredient_id', 'df')),
+            dict(TagRecipe.objects.order_by().values('tag_id')
+                 .annotate(df=Count('recipe_id'))
+                 .values_list('tag_id', 'df')),
+        )
+        cache.set(DF_CACHE_KEY, frequencies, DF_CACHE_TIMEOUT)
+    return frequencies
+
+
+def write_similar(rows):
+    """Insert ``(recipe_id, similar_id, score)`` rows into the staging
+    table."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            buffer = io.StringIO(''.join(
+                f'{recipe_id}\t{similar_id}\t{score!r}\n'
+                for recipe_id, similar_id, score in rows))
+            cursor.copy_expert(
+                f'COPY {STAGING_TABLE} (recipe_id, similar_id, score) '
+                'FROM STDIN', buffer)
+            return
+        cursor.executemany(
+            f'INSERT INTO {STAGING_TABLE} (recipe_id, similar_id, score) '
+            'VALUES (%s, %s, %s)', list(rows))
+
+
+def swap_similar(watermark):
+    """Replace the stored neighbours with the staging table.
+
+    Returns the ids of recipes refreshed meanwhile: every row of their
+    own list is newer than ``watermark``.
+    """
+    table = SimilarRecipe._meta.db_table
+    recipes = Recipe._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # Waits for refreshes in progress and holds new ones (and
+            # recipe deletes) until the swap commits.
+            cursor.execute(
+                f'LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE')
+        refreshed = list(
+            SimilarRecipe.objects
+            .filter(recipe_id__in=SimilarRecipe.objects.filter(
+                id__gt=watermark).values('recipe_id'))
+            .order_by().values('recipe_id')
+            .annotate(first=Min('id'))
+            .filter(first__gt=watermark)
+            .values_list('recipe_id', flat=True))
+        SimilarRecipe.objects.all().delete()
+        # Recipes deleted during the rebuild are left out.
+        cursor.execute(
+            f'INSERT INTO {table} (recipe_id, similar_id, score) '
+            f'SELECT recipe_id, similar_id, score FROM {STAGING_TABLE} '
+            f'WHERE recipe_id IN (SELECT id FROM {recipes}) '
+            f'AND similar_id IN (SELECT id FROM {recipes})')
+    return refreshed
+
+
+def rebuild(k=None, batch_size=BATCH_SIZE, workers=1):
+    """Recompute the neighbours of every recipe; return rows written.
+
+    With ``workers`` > 1 batches are scored by forked processes that
+    share the vectors copy-on-write.
+
+    Rows go to a staging table first and replace the stored ones in one
+    short transaction, so refreshes keep running meanwhile. Recipes
+    refreshed or created during the rebuild are refreshed again on top
+    of the new rows.
+    """
+    global _vectors
+    k = k or settings.SIMILAR_RECIPES_COUNT
+    watermark = SimilarRecipe.objects.aggregate(Max('id'))['id__max'] or 0
+    recipe_ids = np.fromiter(
+        Recipe.objects.order_by('id').values_list('id', flat=True)
+        .iterator(chunk_size=CHUNK_SIZE), dtype=np.int64)
+    total = len(recipe_ids)
+    ingredient_rows, ingredient_columns, ingredient_ids = encode(
+        recipe_ids, *load_pairs(RecipeIngredient, 'ingredient_id'))
+    tag_rows, tag_columns, tag_ids = encode(
+        recipe_ids, *load_pairs(TagRecipe, 'tag_id'))
+    ingredients = binary_matrix(ingredient_rows, ingredient_columns,
+                                (total, len(ingredient_ids)))
+    tags = binary_matrix(tag_rows, tag_columns, (total, len(tag_ids)))
+    ingredient_df = ingredients.getnnz(axis=0)
+    tag_df = tags.getnnz(axis=0)
+    cache.set(DF_CACHE_KEY, (
+        total,
+        dict(zip(ingredient_ids.tolist(), ingredient_df.tolist())),
+        dict(zip(tag_ids.tolist(), tag_df.tolist())),
+    ), DF_CACHE_TIMEOUT)
+    vectors = vectorize(
+        tfidf(ingredients, ingredient_df, total, max_df=df_limit(total)),
+        tfidf(tags, tag_df, total, scale=TAG_WEIGHT))
+    batches = [(start, min(start + batch_size, total), k)
+               for start in range(0, total, batch_size)]
+    pool = None
+    if workers > 1:
+        _vectors = vectors
+        pool = multiprocessing.get_context('fork').Pool(workers)
+        results = pool.imap(rebuild_batch, batches)
+    else:
+        results = (neighbours(vectors, *bounds) for bounds in batches)
+    written = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {STAGING_TABLE}')
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE {STAGING_TABLE} '
+            '(recipe_id bigint, similar_id bigint, score double precision)')
+    try:
+        for rows, columns, scores in results:
+            write_similar(zip(recipe_ids[rows].tolist(),
+                              recipe_ids[columns].tolist(),
+                              scores.tolist()))
+            written += len(rows)
+        refreshed = swap_similar(watermark)
+    finally:
+        if pool is not None:
+            pool.terminate()
+        _vectors = None
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {STAGING_TABLE}')
+    last_id = int(recipe_ids[-1]) if total else 0
+    created = Recipe.objects.filter(id__gt=last_id).values_list('id',
+                                                                flat=True)
+    for recipe_id in sorted({*refreshed, *created}):
+        refresh(recipe_id, k)
+    return written
+
+
+def refresh(recipe_id, k=None):
+    """Recompute the neighbours of one recipe and its place in theirs.
+
+    Candidates are recipes sharing a not-too-frequent ingredient, at
+    most ``CANDIDATE_LIMIT`` of them with the most shared ingredients.
+    """
+    k = k or settings.SIMILAR_RECIPES_COUNT
+    total, ingredient_df, tag_df = document_frequencies()
+    own = RecipeIngredient.objects.filter(
+        recipe_id=recipe_id).values_list('ingredient_id', flat=True)
+    limit = df_limit(total)
+    candidates = list(
+        RecipeIngredient.objects
+        .filter(ingredient_id__in=[
+            ingredient_id for ingredient_id in own
+            if ingredient_df.get(ingredient_id, 0) <= limit
+        ])
+        .exclude(recipe_id=recipe_id)
+        .order_by().values('recipe_id')
+        .annotate(shared=Count('ingredient_id', distinct=True))
+        .order_by('-shared', '-recipe_id')
+        .values_list('recipe_id', flat=True)[:CANDIDATE_LIMIT]
+    )
+    recipe_ids = np.array(sorted([recipe_id, *candidates]), dtype=np.int64)
+    row = int(np.searchsorted(recipe_ids, recipe_id))
+    matrices = []
+    for model, field, df, scale, max_df in (
+            (RecipeIngredient, 'ingredient_id', ingredient_df, 1.0, limit),
+            (TagRecipe, 'tag_id', tag_df, TAG_WEIGHT, None)):
+        rows, columns, feature_ids = encode(recipe_ids, *load_pairs(
+            model, field, recipe_id__in=recipe_ids.tolist()))
+        matrix = binary_matrix(rows, columns,
+                               (len(recipe_ids), len(feature_ids)))
+        frequencies = np.array(
+            [df.get(feature_id, 1) for feature_id in feature_ids.tolist()],
+            dtype=np.float64)
+        matrices.append(tfidf(matrix, frequencies, total, scale, max_df))
+    _, columns, scores = neighbours(vectorize(*matrices), row, row + 1,
+                                    len(recipe_ids))
+    scores = dict(zip(recipe_ids[columns].tolist(), scores.tolist()))
+    top = list(scores.items())[:k]
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe_id=recipe_id).delete()
+        SimilarRecipe.objects.bulk_create(
+            (SimilarRecipe(recipe_id=recipe_id, similar_id=similar_id,
+                           score=score) for similar_id, score in top),
+            ignore_conflicts=True)
+        # Lists that already hold the recipe get its new score.
+        pointing = list(SimilarRecipe.objects.filter(similar_id=recipe_id))
+        SimilarRecipe.objects.filter(id__in=[
+            similar.id for similar in pointing
+            if similar.recipe_id not in scores
+        ]).delete()
+        updated = [similar for similar in pointing
+                   if similar.recipe_id in scores]
+        for similar in updated:
+            similar.score = scores[similar.recipe_id]
+        SimilarRecipe.objects.bulk_update(updated, ['score'])
+        # The recipe joins its neighbours' lists where it makes the cut.
+        # Lists may grow past ``k``; lookups read the best ``k`` and a
+        # full rebuild trims them.
+        present = {similar.recipe_id for similar in pointing}
+        lists = {
+            item['recipe_id']: item for item in
+            SimilarRecipe.objects.filter(
+                recipe_id__in=[similar_id for similar_id, _ in top])
+            .order_by().values('recipe_id')
+            .annotate(size=Count('id'), lowest=Min('score'))
+        }
+        SimilarRecipe.objects.bulk_create(
+            (SimilarRecipe(recipe_id=similar_id, similar_id=recipe_id,
+                           score=score)
+             for similar_id, score in top
+             if similar_id not in present and (
+                 similar_id not in lists
+                 or lists[similar_id]['size'] < k
+                 or lists[similar_id]['lowest'] < score)),
+            ignore_conflicts=True)
+
+
+def refresh_task(recipe_id):
+    try:
+        refresh(recipe_id)
+    except Exception:
+        logger.exception('Could not refresh similar recipes of %s',
+                         recipe_id)
+    finally:
+        connections.close_all()
+
+
+def schedule_refresh(recipe_id):
+    transaction.on_commit(
+        lambda: executor.submit(refresh_task, recipe_id))
+
+
+def similar_recipe_ids(recipe_id, limit):
+    """Ids of the ``limit`` most similar recipes, best first."""
+    return list(
+        SimilarRecipe.objects.filter(recipe_id=recipe_id)
+        .order_by('-score', 'similar_id')
+        .values_list('similar_id', flat=True)[:limit])
@@ -0,0 +1,150 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save
+
+from users.models import MediaFile, Recipe, User
+
+# Model: fields whose stored files are counted, either file fields or
+# thumbnail srcsets (see users.images).
+FILE_FIELDS = {
+    Recipe: ('image', 'image_srcset'),
+    User: ('avatar', 'avatar_srcset'),
+}
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage that names files after their SHA-256 digest.
+
+    ``recipes/image/photo.jpg`` is stored as
+    ``recipes/image/ab/cd/abcd...ef.jpg``, so uploading the same content
+    twice yields the same file. Files are removed only once no model
+    field references them (see ``MediaFile``).
+
+    Saving and deleting a file both lock its ``MediaFile`` row, so a
+    delete never removes a file that a transaction still in progress has
+    just reused. Callers save files and the models referencing them in
+    one transaction.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Equal names mean equal content, so existing files are reused.
+        return name
+
+    def _save(self, name, content):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        full_directory = self.path(directory)
+        os.makedirs(full_directory, exist_ok=True)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=full_directory,
+                                         delete=False) as temporary:
+            try:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temporary.write(chunk)
+            except BaseException:
+                os.unlink(temporary.name)
+                raise
+        digest = digest.hexdigest()
+        name = os.path.join(directory, digest[:2], digest[2:4],
+                            digest + extension)
+        name = name.replace('\\', '/')
+        full_path = self.path(name)
+        with transaction.atomic(savepoint=False):
+            # Waits for a delete of this file that is in progress.
+            lock(name)
+            if os.path.exists(full_path):
+                os.unlink(temporary.name)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                os.replace(temporary.name, full_path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(full_path, self.file_permissions_mode)
+        return name
+
+    def delete(self, name):
+        if not name:
+            return
+        with transaction.atomic(savepoint=False):
+            # Waits for transactions that saved or acquired the file.
+            media_file = MediaFile.objects.select_for_update().filter(
+                name=name).first()
+            if media_file is not None:
+                if media_file.references > 0:
+                    return
+                media_file.delete()
+            super().delete(name)
+
+
+def lock(name):
+    """Lock the ``MediaFile`` row of ``name`` until the transaction ends."""
+    MediaFile.objects.bulk_create([MediaFile(name=name)],
+                                  ignore_conflicts=True)
+    return MediaFile.objects.select_for_update().get(name=name)
+
+
+def acquire(name):
+    MediaFile.objects.bulk_create([MediaFile(name=name)],
+                                  ignore_conflicts=True)
+    MediaFile.objects.filter(name=name).update(references=F('references') + 1)
+
+
+def release(name):
+    MediaFile.objects.filter(name=name).update(references=F('references') - 1)
+    transaction.on_commit(lambda: default_storage.delete(name))
+
+
+def stored_names(value):
+    if isinstance(value, dict):
+        # A srcset: {'source': image name, extension: {width: name}}.
+        return {name for key, thumbnails in value.items()
+                if key != 'source' for name in thumbnails.values()}
+    name = getattr(value, 'name', value)
+    return {name} if name else set()
+
+
+def file_names(instance):
+    return {field: stored_names(instance.__dict__.get(field))
+            for field in FILE_FIELDS[type(instance)]}
+
+
+def remember_files(sender, instance, **kwargs):
+    instance._stored_files = file_names(instance)
+
+
+def count_references(sender, instance, created, update_fields=None,
+                     raw=False, **kwargs):
+    if raw:
+        return
+    old_names = {} if created else instance._stored_files
+    for field, names in file_names(instance).items():
+        if update_fields is not None and field not in update_fields:
+            continue
+        old = old_names.get(field, set())
+        for name in names - old:
+            acquire(name)
+        for name in old - names:
+            release(name)
+        instance._stored_files[field] = names
+
+
+def release_references(sender, instance, **kwargs):
+    for names in instance._stored_files.values():
+        for name in names:
+            release(name)
+
+
+def connect():
+    for sender in FILE_FIELDS:
+        uid = f'storage_{sender.__name__}'
+        post_init.connect(remember_files, sender=sender,
+                          dispatch_uid=f'{uid}_init')
+        post_save.connect(count_references, sender=sender,
+                          dispatch_uid=f'{uid}_save')
+        post_delete.connect(release_references, sender=sender,
+                            dispatch_uid=f'{uid}_delete')
@@ -0,0 +1,125 @@
+from unittest import mock
+
+from django.forms import FileField
+from django.test import TestCase
+
+from users import search, shopping_list
+from users.models import (
+    Recipe,
+    ShoppingCart,
+    ShoppingListItem,
+    Subscription,
+    User
+)
+from users.seed import seed_dataset
+
+
+def form_data(response):
+    """POST data that resubmits the admin change form unchanged."""
+    forms = [response.context['adminform'].form]
+    data = {}
+    for inline in response.context['inline_admin_formsets']:
+        formset = inline.formset
+        management = formset.management_form
+        data.update({management.add_prefix(name): value
+                     for name, value in management.initial.items()})
+        forms.extend(formset.forms)
+    for form in forms:
+        for name, field in form.fields.items():
+            value = form[name].value()
+            if value is not None and not isinstance(field, FileField):
+                data[form.add_prefix(name)] = value
+    return data
+
+
+class AdminTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(users=3, recipes=4, ingredients_per_recipe=2,
+                     favorites=0, cart=2, subscriptions=0)
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin')
+        cls.recipe = Recipe.objects.order_by('id').first()
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def assertShoppingListsConsistent(self):
+        self.assertEqual(
+            set(ShoppingListItem.objects.values_list(
+                'user_id', 'ingredient_id', 'total_amount')),
+            set(shopping_list.expected_items()))
+
+
+class RecipeAdminTest(AdminTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.url = f'/admin/users/recipe/{self.recipe.pk}/change/'
+
+    def change(self, **fields):
+        data = form_data(self.client.get(self.url))
+        data.update(fields)
+        response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 302)
+
+    def test_inline_edit_refreshes_search_vector(self):
+        row = self.recipe.ingredients_in_recipe.order_by('id').first()
+        with mock.patch.object(search, 'update_search_vectors') as update:
+            self.change(**{'ingredients_in_recipe-0-amount': 999})
+        row.refresh_from_db()
+        self.assertEqual(row.amount, 999)
+        update.assert_called_once_with([self.recipe.pk])
+
+    def test_inline_edit_updates_shopping_lists(self):
+        ShoppingCart.objects.get_or_create(user=self.admin,
+                                           recipe=self.recipe)
+        shopping_list.add_recipe(self.admin, self.recipe)
+        self.change(**{'ingredients_in_recipe-0-amount': 999,
+                       'ingredients_in_recipe-1-DELETE': 'on'})
+        self.assertShoppingListsConsistent()
+
+
+class LinkAdminTest(AdminTestCase):
+
+    def add(self, model, **fields):
+        return self.client.post(
+            f'/admin/users/{model._meta.model_name}/add/', fields)
+
+    def test_added_cart_updates_shopping_list_and_counter(self):
+        response = self.add(ShoppingCart, user=self.admin.pk,
+                            recipe=self.recipe.pk)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(ShoppingCart.objects.filter(
+            user=self.admin, recipe=self.recipe).exists())
+        self.assertShoppingListsConsistent()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.cart_count, ShoppingCart.objects.filter(
+            recipe=self.recipe).count())
+
+    def test_added_subscription_fills_feed_and_counter(self):
+        Recipe.objects.update(fanned_out=True)
+        author = self.recipe.author
+        response = self.add(Subscription, user=self.admin.pk,
+                            author=author.pk)
+        self.assertEqual(response.status_code, 302)
+        author.refresh_from_db()
+        self.assertEqual(author.subscribers_count, 1)
+        self.assertEqual(
+            set(self.admin.feed.values_list('recipe_id', flat=True)),
+            set(author.recipe_author.values_list('id', flat=True)))
+
+    def test_self_subscription_is_rejected(self):
+        response = self.add(Subscription, user=self.admin.pk,
+                            author=self.admin.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Subscription.objects.exists())
+
+    def test_deleted_cart_updates_shopping_list(self):
+        cart = ShoppingCart.objects.first()
+        response = self.client.post(
+            f'/admin/users/shoppingcart/{cart.pk}/delete/', {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(ShoppingCart.objects.filter(pk=cart.pk).exists())
+        self.assertShoppingListsConsistent()
@@ -0,0 +1,53 @@
+from django.db.models.deletion import Collector
+from rest_framework.test import APITestCase
+
+from users import counters
+from users.models import (
+    FeedItem,
+    Favorite,
+    Recipe,
+    ShoppingCart,
+    Subscription
+)
+from users.seed import seed_dataset
+
+
+class CountersTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_dataset(users=6, recipes=30, ingredients_per_recipe=3,
+                                favorites=6, cart=6, subscriptions=3)
+
+    def assertNoDrift(self):
+        self.assertEqual(sum(counters.reconcile().values()), 0)
+
+    def test_cascaded_links_are_fast_deleted(self):
+        collector = Collector(using='default')
+        for model in counters.LINKS:
+            self.assertTrue(collector.can_fast_delete(
+                model.objects.filter(user=self.user)))
+
+    def test_user_delete_recounts_linked_objects(self):
+        self.assertNoDrift()
+        self.user.delete()
+        self.assertNoDrift()
+
+    def test_recipe_delete(self):
+        Recipe.objects.filter(
+            pk__in=Favorite.objects.values('recipe_id')[:3]).delete()
+        self.assertNoDrift()
+
+    def test_single_deletes_through_the_api(self):
+        self.client.force_authenticate(self.user)
+        favorite = Favorite.objects.filter(user=self.user).first()
+        cart = ShoppingCart.objects.filter(user=self.user).first()
+        subscription = Subscription.objects.filter(user=self.user).first()
+        for path in (f'/api/recipes/{favorite.recipe_id}/favorite/',
+                     f'/api/recipes/{cart.recipe_id}/shopping_cart/',
+                     f'/api/users/{subscription.author_id}/subscribe/'):
+            self.assertEqual(self.client.delete(path).status_code, 204)
+            self.assertEqual(self.client.delete(path).status_code, 400)
+        self.assertNoDrift()
+        self.assertFalse(FeedItem.objects.filter(
+            user=self.user, author_id=subscription.author_id).exists())
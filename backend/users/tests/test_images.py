@@ -0,0 +1,73 @@
+import base64
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+
+from users import images
+from users.models import User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def png(width=10, height=10):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), 'red').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class DecodeBase64ImageTest(SimpleTestCase):
+
+    def decode(self, encoded, max_size=1024 * 1024):
+        return images.decode_base64_image(
+            'data:image/png;base64,' + encoded, max_size)
+
+    def test_line_breaks_are_ignored(self):
+        content = png()
+        encoded = base64.encodebytes(content).decode()
+        self.assertIn('\n', encoded)
+        image_file = self.decode(encoded)
+        self.assertEqual(image_file.read(), content)
+        self.assertEqual(image_file.size, len(content))
+
+    def test_invalid_characters_are_rejected(self):
+        with self.assertRaisesMessage(images.ImageError,
+                                      'Некорректное изображение.'):
+            self.decode('iVBOR*w0KGgo=')
+
+    def test_oversized_payload_is_rejected(self):
+        with self.assertRaisesMessage(images.ImageError,
+                                      'Изображение слишком большое.'):
+            self.decode(base64.b64encode(png()).decode(), max_size=16)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ThumbnailTest(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def test_thumbnails_are_rendered_after_the_request(self):
+        name = default_storage.save('users/a.png',
+                                    ContentFile(png(800, 600)))
+        user = User.objects.create(username='cook', email='cook@example.com')
+        with mock.patch.object(images.executor, 'submit') as submit, \
+                self.captureOnCommitCallbacks(execute=True):
+            user.avatar = name
+            user.save()
+            submit.assert_not_called()
+        submit.assert_called_once_with(images.thumbnail_task, User, user.pk,
+                                       name)
+        self.assertEqual(User.objects.get(pk=user.pk).avatar_srcset, {})
+        images.generate_thumbnails(User, user.pk, name)
+        srcset = User.objects.get(pk=user.pk).avatar_srcset
+        self.assertEqual(srcset['source'], name)
+        for extension in images.THUMBNAIL_FORMATS:
+            self.assertTrue(srcset[extension])
@@ -0,0 +1,57 @@
+import json
+import shutil
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from users import catalog
+from users.models import Ingredient, Tag
+
+
+class LoadCatalogTest(TestCase):
+
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def write(self, name, content):
+        path = self.directory / name
+        path.write_text(content, encoding='utf-8')
+        return str(path)
+
+    def load(self, *args):
+        call_command('load_catalog', *args, stdout=StringIO())
+
+    def catalog(self):
+        return set(Ingredient.objects.values_list('name',
+                                                  'measurement_unit'))
+
+    def test_csv_and_json_are_loaded_once(self):
+        csv_path = self.write('ingredients.csv',
+                              'соль,г\nмолоко , мл\nсоль,г\n')
+        json_path = self.write('ingredients.json', json.dumps([
+            {'name': 'яйцо', 'measurement_unit': 'шт'},
+            {'name': 'молоко', 'measurement_unit': 'мл'},
+        ], ensure_ascii=False))
+        tags_path = self.write('tags.json', json.dumps([
+            {'name': 'Завтрак', 'slug': 'breakfast'}], ensure_ascii=False))
+        # Objects split across reads are still decoded.
+        with mock.patch.object(catalog, 'CHUNK_SIZE', 16):
+            for _ in range(2):
+                self.load(csv_path, json_path, '--tags', tags_path,
+                          '--batch-size', '2')
+        self.assertEqual(self.catalog(), {('соль', 'г'), ('молоко', 'мл'),
+                                          ('яйцо', 'шт')})
+        self.assertEqual(list(Tag.objects.values_list('slug', flat=True)),
+                         ['breakfast'])
+
+    def test_broken_file_loads_nothing(self):
+        csv_path = self.write('ingredients.csv', 'соль,г\n')
+        json_path = self.write('broken.json', '{"name": "соль"}')
+        with self.assertRaises(CommandError):
+            self.load(csv_path, json_path)
+        self.assertFalse(Ingredient.objects.exists())
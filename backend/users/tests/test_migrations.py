@@ -0,0 +1,64 @@
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+class MergeDuplicateIngredientsTest(TransactionTestCase):
+    migrate_from = [('users', '0013_ingredient_name_search_indexes')]
+    migrate_to = [('users', '0014_ingredient_unique_name_unit')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def setUp(self):
+        apps = self.migrate(self.migrate_from)
+        User = apps.get_model('users', 'User')
+        Ingredient = apps.get_model('users', 'Ingredient')
+        Recipe = apps.get_model('users', 'Recipe')
+        RecipeIngredient = apps.get_model('users', 'RecipeIngredient')
+        ShoppingCart = apps.get_model('users', 'ShoppingCart')
+        ShoppingListItem = apps.get_model('users', 'ShoppingListItem')
+        user = User.objects.create(username='cook', email='cook@example.com',
+                                   first_name='Cook', last_name='Book')
+        Ingredient.objects.bulk_create([
+            Ingredient(name='мука', measurement_unit='г'),
+            Ingredient(name='мука', measurement_unit='г'),
+        ])
+        first, second = Ingredient.objects.order_by('id')
+        self.flour_id = first.id
+        recipe = Recipe.objects.create(author=user, name='Блины',
+                                       image='recipes/image/a.png',
+                                       text='Тесто.', cooking_time=20)
+        # The same flour listed twice through the duplicates.
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe=recipe, ingredient=first, amount=200),
+            RecipeIngredient(recipe=recipe, ingredient=second, amount=200),
+        ])
+        ShoppingCart.objects.create(user=user, recipe=recipe)
+        ShoppingListItem.objects.bulk_create([
+            ShoppingListItem(user=user, ingredient=first, total_amount=200),
+            ShoppingListItem(user=user, ingredient=second, total_amount=200),
+        ])
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_duplicates_are_merged_without_adding_amounts(self):
+        apps = self.migrate(self.migrate_to)
+        Ingredient = apps.get_model('users', 'Ingredient')
+        RecipeIngredient = apps.get_model('users', 'RecipeIngredient')
+        ShoppingListItem = apps.get_model('users', 'ShoppingListItem')
+        self.assertEqual(list(Ingredient.objects.values_list('id', flat=True)),
+                         [self.flour_id])
+        self.assertEqual(
+            list(RecipeIngredient.objects.values_list(
+                'ingredient_id', 'amount')),
+            [(self.flour_id, 200)])
+        self.assertEqual(
+            list(ShoppingListItem.objects.values_list(
+                'ingredient_id', 'total_amount')),
+            [(self.flour_id, 200)])
@@ -0,0 +1,82 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from users import similarity
+from users.models import (
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    SimilarRecipe,
+    User
+)
+
+
+class SimilarRecipesTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='cook',
+                                         email='cook@example.com')
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {i}', measurement_unit='г')
+            for i in range(8))
+        cls.ingredients = list(Ingredient.objects.order_by('id'))
+        # Pancakes and crepes share most ingredients, the salad none.
+        cls.pancakes = cls.create_recipe('Блины', 0, 1, 2, 3)
+        cls.crepes = cls.create_recipe('Крепы', 0, 1, 2, 4)
+        cls.fritters = cls.create_recipe('Оладьи', 0, 5)
+        cls.salad = cls.create_recipe('Салат', 6, 7)
+
+    @classmethod
+    def create_recipe(cls, name, *ingredients):
+        recipe = Recipe.objects.create(author=cls.author, name=name,
+                                       text='Текст.', cooking_time=10,
+                                       image='recipes/image/a.png')
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=cls.ingredients[i],
+                             amount=1)
+            for i in ingredients)
+        return recipe
+
+    def setUp(self):
+        cache.clear()
+
+    def similar(self, recipe):
+        return similarity.similar_recipe_ids(recipe.pk, 3)
+
+    def test_rebuild_ranks_closest_recipe_first(self):
+        similarity.rebuild(k=3)
+        self.assertEqual(self.similar(self.pancakes),
+                         [self.crepes.pk, self.fritters.pk])
+        self.assertEqual(self.similar(self.salad), [])
+
+    def test_changes_during_rebuild_survive_the_swap(self):
+        similarity.rebuild(k=3)
+        write_similar = similarity.write_similar
+
+        def write_while_recipes_change(rows):
+            write_similar(rows)
+            # Another process deletes a recipe and creates one.
+            self.fritters.delete()
+            self.waffles = self.create_recipe('Вафли', 0, 1, 2, 3)
+            similarity.refresh(self.waffles.pk, k=3)
+
+        with mock.patch.object(similarity, 'write_similar',
+                               write_while_recipes_change):
+            similarity.rebuild(k=3)
+        recipe_ids = set(Recipe.objects.values_list('id', flat=True))
+        self.assertFalse(SimilarRecipe.objects.exclude(
+            recipe_id__in=recipe_ids).exists())
+        self.assertFalse(SimilarRecipe.objects.exclude(
+            similar_id__in=recipe_ids).exists())
+        self.assertEqual(self.similar(self.waffles)[0], self.pancakes.pk)
+        self.assertIn(self.waffles.pk, self.similar(self.pancakes))
+
+    def test_refresh_matches_rebuild(self):
+        similarity.rebuild(k=3)
+        expected = self.similar(self.crepes)
+        SimilarRecipe.objects.filter(recipe=self.crepes).delete()
+        similarity.refresh(self.crepes.pk, k=3)
+        self.assertEqual(self.similar(self.crepes), expected)
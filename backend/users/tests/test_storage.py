@@ -0,0 +1,71 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from users.images import generate_thumbnails
+from users.models import MediaFile, User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ContentAddressedStorageTest(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def create_user(self, username, avatar):
+        return User.objects.create(username=username,
+                                   email=f'{username}@example.com',
+                                   avatar=avatar)
+
+    def test_shared_file_is_deleted_with_last_reference(self):
+        name = default_storage.save('users/a.png', ContentFile(b'avatar'))
+        self.assertEqual(
+            default_storage.save('users/b.png', ContentFile(b'avatar')),
+            name)
+        first = self.create_user('first', name)
+        second = self.create_user('second', name)
+        self.assertEqual(MediaFile.objects.get(name=name).references, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(default_storage.exists(name))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(MediaFile.objects.filter(name=name).exists())
+
+    def test_delete_keeps_referenced_file(self):
+        name = default_storage.save('users/a.png', ContentFile(b'kept'))
+        self.create_user('owner', name)
+        default_storage.delete(name)
+        self.assertTrue(default_storage.exists(name))
+
+    def test_thumbnails_are_released_with_the_image(self):
+        buffer = BytesIO()
+        Image.new('RGB', (800, 600), 'red').save(buffer, 'PNG')
+        name = default_storage.save('users/a.png',
+                                    ContentFile(buffer.getvalue()))
+        user = self.create_user('owner', name)
+        generate_thumbnails(User, user.pk, name)
+        user = User.objects.get(pk=user.pk)
+        thumbnails = [thumbnail
+                      for extension in ('webp', 'jpeg')
+                      for thumbnail in user.avatar_srcset[extension].values()]
+        self.assertTrue(thumbnails)
+        for thumbnail in thumbnails:
+            self.assertEqual(
+                MediaFile.objects.get(name=thumbnail).references, 1)
+        user.avatar = ''
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        self.assertEqual(user.avatar_srcset, {})
+        for thumbnail in thumbnails:
+            self.assertFalse(default_storage.exists(thumbnail))